@@ -14,9 +14,11 @@ import mysql.connector
 
 # 将项目根目录添加到Python模块搜索路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from utils.retriever import GithubRepoRetriever
 from utils.generator import RAGGenerator
+from tools.embeddings import EmbeddingError
 
 # 配置信息
 SETTINGS = {
@@ -68,9 +70,17 @@ with st.container(border=False, height=670, key="main"):
     # 处理查询
     if submit_button and query:
         with st.spinner("正在处理您的问题..."):
-            if search_only:
-                # 仅显示检索结果
+            # 问题向量化失败时提示错误，不显示检索结果
+            try:
                 search_results = retriever.search(query, limit=result_count)
+                embedding_error = None
+            except EmbeddingError as e:
+                search_results, embedding_error = [], e
+            
+            if embedding_error is not None:
+                st.error(f"问题向量化失败，请稍后重试：{str(embedding_error)}")
+            elif search_only:
+                # 仅显示检索结果
                 st.subheader("检索到的相关仓库")
                 
                 for i, result in enumerate(search_results):
@@ -118,9 +128,6 @@ with st.container(border=False, height=670, key="main"):
                 temperature = st.session_state.get('temperature', 0.7)
                 max_tokens = st.session_state.get('max_tokens', 1500)
                 
-                # 获取检索结果
-                search_results = retriever.search(query, limit=result_count)
-                
                 # 生成回答
                 response = generator.generate_response(query)
                 
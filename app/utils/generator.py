@@ -1,10 +1,13 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from openai import OpenAI
 import json
 from datetime import datetime
 
+from tools.embeddings import EmbeddingError
+
 class RAGGenerator:
     def __init__(self, settings, retriever):
         """
@@ -56,7 +59,10 @@ class RAGGenerator:
             生成的回答
         """
         # 检索相关仓库
-        search_results = self.retriever.search(query, limit=3)
+        try:
+            search_results = self.retriever.search(query, limit=3)
+        except EmbeddingError as e:
+            return f"问题向量化失败，暂时无法检索相关仓库，请稍后重试: {str(e)}"
         
         if not search_results:
             return "未找到与您的问题相关的GitHub仓库信息。请尝试使用不同的关键词。"
@@ -86,9 +92,14 @@ class RAGGenerator:
                 if star_history:
                     context += f"   {self._format_star_history(star_history, max_points=5)}\n"
                 
-                # 添加README摘要
+                # 优先使用与问题最相关的README片段，没有片段时退回README开头的摘要
                 readme_content = result.get("readme_content", "")
-                if readme_content:
+                if result.get("chunks"):
+                    context += "   相关README片段:\n"
+                    for chunk in result["chunks"]:
+                        context += f"   - {chunk}\n"
+                    context += "\n"
+                elif readme_content:
                     # 截取README的前500个字符作为摘要
                     readme_summary = readme_content[:500] + "..." if len(readme_content) > 500 else readme_content
                     context += f"   README摘要: {readme_summary}\n\n"
@@ -1,11 +1,15 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from qdrant_client import QdrantClient
-from openai import OpenAI
 import mysql.connector
 import datetime
+import uuid
+
+from tools.config import EMBEDDING_SETTINGS
+from tools.embeddings import get_embedding_backend
 
 class GithubRepoRetriever:
     def __init__(self, settings):
@@ -20,45 +24,73 @@ class GithubRepoRetriever:
             url=settings.get('qdrant_url', 'http://localhost:6333')
         )
         self.collection_name = "github_repos"
+        # README片段集合，每个仓库的README切分为多个片段分别存储向量
+        self.chunk_collection = settings.get('chunk_collection', 'github_repo_chunks')
         
-        # 初始化OpenAI客户端，用于创建嵌入向量
-        self.openai_client = OpenAI(
-            api_key=settings.get('qwen_api_key'),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
+        # 与采集时使用同一个嵌入后端：嵌入后端和模型统一在tools/config.py的EMBEDDING_SETTINGS中配置，页面不应覆盖
+        self.embedding_backend = get_embedding_backend({**EMBEDDING_SETTINGS, **settings})
     
-    """使用Qwen模型创建文本嵌入"""
+    """使用配置的嵌入后端创建文本嵌入，失败时抛出EmbeddingError"""
     def create_embedding(self, text):
-        # 截取文本以适应API限制
-        text = text[:8000] if text else ""
-        
-        try:
-            completion = self.openai_client.embeddings.create(
-                model="text-embedding-v3",
-                input=text,
-                dimensions=1024,
-                encoding_format="float"
-            )
-            return completion.data[0].embedding
-        except Exception as e:
-            print(f"创建嵌入向量失败: {str(e)}")
-            # 返回一个全零向量作为fallback
-            return [0.0] * 1024
+        return self.embedding_backend.embed([text])[0]
     
     """根据查询文本检索相关仓库"""
-    def search(self, query, limit=5):
+    def search(self, query, limit=5, chunks_per_repo=3):
         """        
         参数:
             query: 查询文本
             limit: 返回结果数量上限
+            chunks_per_repo: 每个仓库返回的最相关README片段数
             
         返回:
-            检索到的仓库列表
+            检索到的仓库列表，chunks为按相关度排序的README片段
         """
         # 创建查询文本的嵌入向量
         query_vector = self.create_embedding(query)
         
-        # 在Qdrant中进行向量搜索
+        try:
+            # 在片段集合中检索，按仓库分组，每个仓库保留最相关的几个片段
+            groups = self.qdrant_client.search_groups(
+                collection_name=self.chunk_collection,
+                query_vector=query_vector,
+                group_by="repo_name",
+                limit=limit,
+                group_size=chunks_per_repo
+            ).groups
+        except Exception as e:
+            print(f"片段检索失败，改为整篇README检索: {str(e)}")
+            return self._search_repos(query_vector, limit)
+        
+        if not groups:
+            return self._search_repos(query_vector, limit)
+        
+        # 从仓库集合中取出star历史等仓库级信息
+        repo_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"github.com/{group.id}")) for group in groups]
+        points = self.qdrant_client.retrieve(
+            collection_name=self.collection_name,
+            ids=repo_ids,
+            with_payload=True,
+            with_vectors=False
+        )
+        payloads = {point.payload.get("repo_name"): point.payload for point in points}
+        
+        results = []
+        for repo_id, group in zip(repo_ids, groups):
+            payload = payloads.get(group.id, {})
+            results.append({
+                "repo_name": group.id,
+                "readme_content": payload.get("readme_content"),
+                "star_history": payload.get("star_history", {}),
+                "score": group.hits[0].score,
+                "id": repo_id,
+                "last_updated": payload.get("last_updated"),
+                "chunks": [hit.payload.get("text") for hit in group.hits]
+            })
+        
+        return results
+    
+    """在仓库集合中按整篇README的向量检索"""
+    def _search_repos(self, query_vector, limit):
         search_result = self.qdrant_client.search(
             collection_name=self.collection_name,
             query_vector=query_vector,
@@ -75,7 +107,8 @@ class GithubRepoRetriever:
                 "star_history": payload.get("star_history", {}),
                 "score": hit.score,
                 "id": hit.id,
-                "last_updated": payload.get("last_updated")
+                "last_updated": payload.get("last_updated"),
+                "chunks": []
             })
         
         return results
@@ -98,9 +131,10 @@ class GithubRepoRetriever:
         # 获取贡献者信息
         contributors_query = """
         SELECT c.login, c.avatar_url, rc.contributions
-        FROM repo_contributors rc
-        JOIN contributors c ON rc.contributor_url = c.url
-        WHERE rc.repo_url = (SELECT url FROM repositories WHERE name = %s)
+        FROM repositories r
+        JOIN repo_contributors rc ON rc.repo_id = r.id
+        JOIN contributors c ON c.id = rc.contributor_id
+        WHERE r.name = %s
         ORDER BY rc.contributions DESC
         LIMIT 10
         """
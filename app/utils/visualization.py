@@ -1,3 +1,7 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -16,6 +20,8 @@ from qdrant_client import QdrantClient
 
 import matplotlib.font_manager as fm
 
+from tools.rollups import STAR_BUCKETS, FORK_BUCKETS, ROLLUP_MIN_PAIR_COUNT
+
 # 加载字体文件
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 指定默认字体为 SimHei（黑体）
  # 指定默认字体为 SimHei（黑体）
@@ -48,6 +54,19 @@ def qdrant_client_init():
 # 获取每年star数和分支数超过一定量的仓库数
 def get_repo_num_by_year(min_stars=100, min_forks = 0):
     conn = conn_init()
+    # 筛选条件正好是分档下限时直接读取汇总表，否则扫描repositories表
+    if min_stars in STAR_BUCKETS and min_forks in FORK_BUCKETS:
+        query = f"""
+            SELECT year, SUM(num) AS num
+            FROM rollup_repo_year
+            WHERE star_bucket >= {min_stars} and fork_bucket >= {min_forks}
+            GROUP BY year
+            ORDER BY year
+            """
+        df = pd.read_sql(query, conn)
+        conn.close()
+        return df
+    
     query= f"""
         SELECT 
             YEAR(created_at) AS year,  
@@ -249,9 +268,9 @@ def draw_language_river(percentaged=True, top = 20):
     query = f"""
             WITH top_languages AS (
             SELECT `language`
-            FROM repositories
+            FROM rollup_language_year
             GROUP BY `language`
-            ORDER BY COUNT(*) DESC
+            ORDER BY SUM(num) DESC
             LIMIT {top}
             )
             SELECT 
@@ -262,16 +281,17 @@ def draw_language_river(percentaged=True, top = 20):
                     WHEN `language` IN (SELECT `language` FROM top_languages) THEN `language`  -- 保留前 20 的语言
                     ELSE 'others'  -- 其他语言汇总为 'others'
                 END AS language_group,  -- 重命名分组后的语言
-                YEAR(created_at) AS year,  -- 提取年份
-                COUNT(*) AS num  -- 计算每年的记录数
+                year,
+                SUM(num) AS num  -- 计算每年的记录数
             FROM 
-                repositories
+                rollup_language_year  -- 按语言和年份预先汇总的仓库数
             GROUP BY 
                 language_group, year  -- 按分组后的语言和年份分组
             ORDER BY 
                 year;  -- 按年份排序
         """
     result = pd.read_sql(query, conn)
+    conn.close()
     result=result.pivot(index='year', columns='language_group', values='num').fillna(0)
     if percentaged:
         result=result.div(result.sum(axis=1), axis=0)
@@ -483,28 +503,20 @@ def visualize_star_calendar(star_df, repo_name):
 # 获得仓库的topic数据
 def get_topics_num_dict(begin_year=None,end_year=None, year=None):
     conn = conn_init()
+    # 从按topic和年份预先汇总的计数中读取
     query = """
-        select name, topics 
-        from repositories
+        select t.name, sum(ty.num) as num
+        from rollup_topic_year ty
+        join topics t on t.id = ty.topic_id
     """
     if year:
-        query += f" where created_at >= '{year}-01-01' and created_at <= '{year}-12-31'"
+        query += f" where ty.year = {int(year)}"
     elif begin_year and end_year:
-        query += f" where created_at >= '{begin_year}-01-01' and created_at <= '{end_year}-12-31'"
-    result =pd.read_sql(query, conn)
-    result.head()
-    length = result.shape[0]
-    topics_num_dict = {}
-    for i in range(length):
-        elements = result['topics'][i].split(',')
-        if elements == ['']:
-            continue
-        for element in elements:
-            if element in topics_num_dict:
-                topics_num_dict[element] += 1
-            else:
-                topics_num_dict[element] = 1
-    topics_num_dict = {k: v for k, v in sorted(topics_num_dict.items(), key=lambda item: item[1], reverse=True)}
+        query += f" where ty.year between {int(begin_year)} and {int(end_year)}"
+    query += " group by ty.topic_id, t.name order by num desc"
+    result = pd.read_sql(query, conn)
+    conn.close()
+    topics_num_dict = dict(zip(result['name'], result['num'].astype(int)))
 
     return topics_num_dict
 
@@ -545,53 +557,47 @@ def get_topics_graph_data(min_node_value=1000, min_edge_value=100, max_nodes=200
     max_nodes: 最大节点数量
     """
     conn = conn_init()
-    query = """
-        select name, topics 
-        from repositories
+    # 节点：出现次数足够多的topic，按出现次数取前max_nodes个
+    nodes_query = f"""
+        select ty.topic_id, t.name, sum(ty.num) as num
+        from rollup_topic_year ty
+        join topics t on t.id = ty.topic_id
+        group by ty.topic_id, t.name
+        having num >= {min_node_value}
+        order by num desc
+        limit {max_nodes}
     """
-    result = pd.read_sql(query, conn)
+    nodes = pd.read_sql(nodes_query, conn)
+    sorted_nodes = dict(zip(nodes['name'], nodes['num'].astype(int)))
+    
+    filtered_edges = {}
+    if not nodes.empty:
+        # 边：两个topic在同一仓库中共同出现的次数，只统计筛选后的节点
+        topic_ids = ", ".join(str(int(topic_id)) for topic_id in nodes['topic_id'])
+        if min_edge_value >= ROLLUP_MIN_PAIR_COUNT:
+            # 汇总表保留了所有达到ROLLUP_MIN_PAIR_COUNT的组合
+            edges_query = f"""
+                select topic_a as source_id, topic_b as target_id, num
+                from rollup_topic_pairs
+                where topic_a in ({topic_ids}) and topic_b in ({topic_ids}) and num >= {min_edge_value}
+            """
+        else:
+            edges_query = f"""
+                select a.topic_id as source_id, b.topic_id as target_id, count(*) as num
+                from repo_topics a
+                join repo_topics b on b.repo_id = a.repo_id and b.topic_id > a.topic_id
+                where a.topic_id in ({topic_ids}) and b.topic_id in ({topic_ids})
+                group by a.topic_id, b.topic_id
+                having num >= {min_edge_value}
+            """
+        edges = pd.read_sql(edges_query, conn)
+        names = dict(zip(nodes['topic_id'], nodes['name']))
+        for source_id, target_id, num in edges.itertuples(index=False):
+            # 确保边的两个节点按字母顺序排序，保证无向图的唯一性
+            edge = tuple(sorted([names[source_id], names[target_id]]))
+            filtered_edges[edge] = int(num)
     conn.close()
     
-    # 存储节点信息
-    nodes_dict = {}  # 记录每个topic元素出现的次数
-    # 存储边信息（无向图）
-    edges_dict = {}  # 记录任意两个topic元素共同出现的次数
-    
-    length = result.shape[0]
-    for i in range(length):
-        elements = result['topics'][i].split(',')
-        if elements == ['']:
-            continue
-            
-        # 去重，确保同一仓库中重复的topic只计算一次
-        elements = list(set(elements))
-        
-        # 更新节点出现次数
-        for element in elements:
-            if element in nodes_dict:
-                nodes_dict[element] += 1
-            else:
-                nodes_dict[element] = 1
-        
-        # 更新边的权重（任意两个元素的共现次数）
-        for i in range(len(elements)):
-            for j in range(i+1, len(elements)):  # 只处理不重复的组合
-                # 确保边的两个节点按字母顺序排序，保证无向图的唯一性
-                edge = tuple(sorted([elements[i], elements[j]]))
-                if edge in edges_dict:
-                    edges_dict[edge] += 1
-                else:
-                    edges_dict[edge] = 1
-    
-    # 筛选出现次数较多的节点
-    filtered_nodes = {k: v for k, v in nodes_dict.items() if v >= min_node_value}
-    # 按出现次数排序并限制节点数量
-    sorted_nodes = dict(sorted(filtered_nodes.items(), key=lambda item: item[1], reverse=True)[:max_nodes])
-    
-    # 筛选权重较高的边，且边的两个节点都在筛选后的节点集合中
-    filtered_edges = {e: count for e, count in edges_dict.items() 
-                     if count >= min_edge_value and e[0] in sorted_nodes and e[1] in sorted_nodes}
-    
     # 返回节点和边的原始数据
     return {"nodes": sorted_nodes, "edges": filtered_edges}
 
@@ -775,7 +781,7 @@ def visualize_topics_network(community_data):
 
 def get_top_contributors(limit=20):
     """
-    从top_contributors视图中获取前N名贡献者数据
+    从top_contributors表中按索引读取前N名贡献者数据
     
     参数:
     limit: 获取的贡献者数量，默认为20
@@ -785,8 +791,10 @@ def get_top_contributors(limit=20):
     """
     conn = conn_init()
     query = f"""
-        SELECT curl, total_allocated_star
-        FROM top_contributors
+        SELECT c.url AS curl, t.total_allocated_star
+        FROM top_contributors t
+        JOIN contributors c ON c.id = t.contributor_id
+        ORDER BY t.total_allocated_star DESC
         LIMIT {limit}
     """
     df = pd.read_sql(query, conn)
@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+import tools.get_data as get_data
+
+
+class DetailPipelineTest(unittest.TestCase):
+    """仓库详情流水线中部分获取或保存失败时，不应覆盖已保存的数据"""
+
+    def setUp(self):
+        self.env = {
+            "SETTINGS": {**get_data.DEFAULT_SETTINGS, "headers": {}},
+            "client": mock.Mock(),
+            "qdrant_client": mock.Mock(),
+            "collection_name": "repos",
+            "get_conn": mock.Mock(),
+        }
+        # plan_detail_refresh不为需要重新获取README的仓库加载readme_content
+        self.cached = {
+            "qdrant_id": "1",
+            "is_fresh": False,
+            "readme_unchanged": False,
+            "payload": {
+                "star_history": {"2024-01-01": 5},
+                "pushed_at": "2024-01-01T00:00:00",
+                "stars": 5,
+                "chunk_count": 2,
+                "readme_hash": get_data.readme_hash("OLD README"),
+                "embedding_model": "model",
+            },
+        }
+        self.task = get_data._new_detail_task("a/b", "https://github.com/a/b", cached=self.cached,
+                                              metadata={"pushed_at": "2025-02-02T00:00:00", "stars": 9})
+
+    def _run(self, **overrides):
+        """依次执行各阶段，返回被替换的函数；overrides替换默认的桩函数"""
+        patches = {
+            "get_readme": mock.Mock(side_effect=RuntimeError("500")),
+            "get_contributors": mock.Mock(return_value=[]),
+            "get_star_history_tail": mock.Mock(return_value=({"2024-01-01": 5, "2025-02-01": 4}, False)),
+            "embedding_model_key": mock.Mock(return_value="model"),
+            "load_cached_payloads": mock.Mock(return_value={"a/b": {"payload": {"readme_content": "OLD README"}}}),
+            "embed_with_cache": mock.Mock(return_value={}),
+            "save_contributors_to_db": mock.Mock(),
+            "save_readme_chunks": mock.Mock(return_value=0),
+            "save_to_qdrant": mock.Mock(return_value="1"),
+            "update_mysql_mapping": mock.Mock(),
+        }
+        patches.update(overrides)
+        with mock.patch.multiple(get_data, **patches):
+            for name, stages in get_data.DETAIL_STAGES:
+                for stage in stages:
+                    if name in get_data.DETAIL_BATCH_STAGES:
+                        stage([self.task], self.env)
+                    else:
+                        stage(self.task, self.env)
+        return patches
+
+    def test_readme_failure_keeps_stored_readme_and_chunks(self):
+        patches = self._run()
+
+        self.assertEqual(self.task["result"]["failed_parts"], ["readme"])
+        self.assertEqual(self.task["result"]["readme_content"], "OLD README")
+        patches["embed_with_cache"].assert_not_called()
+        patches["save_readme_chunks"].assert_not_called()
+        # 只更新star历史，不覆盖README和向量，也不记录新的pushed_at
+        kwargs = patches["save_to_qdrant"].call_args.kwargs
+        self.assertTrue(kwargs["vector_unchanged"])
+        self.assertEqual(kwargs["metadata"], {"pushed_at": "2024-01-01T00:00:00", "stars": 9})
+
+    def test_contributor_save_failure_keeps_pushed_at(self):
+        patches = self._run(get_readme=mock.Mock(return_value="OLD README"),
+                            save_contributors_to_db=mock.Mock(side_effect=RuntimeError("deadlock")))
+
+        patches["save_contributors_to_db"].assert_called_once()
+        self.assertEqual(self.task["result"]["failed_parts"], ["contributors"])
+        kwargs = patches["save_to_qdrant"].call_args.kwargs
+        self.assertEqual(kwargs["metadata"]["pushed_at"], "2024-01-01T00:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,10 +10,37 @@ GITHUB_SETTINGS = {
     'sort': 'stars',
     'order': 'desc',
     'perpage': 100,
+    'crawl_workers': 4,  # 并发获取仓库列表的线程数
+    'crawl_retries': 3,  # 获取仓库列表时失败的探测或分页的重试次数，仍失败的记入错误数据
+    'refresh_rollups': True,  # get_top_starred_repos完成后重新计算看板汇总表（tools/rollups.py）
+    'http_pool_size': None,  # 连接池大小，应不小于并发请求数；None表示按各线程数配置计算（见github_client.default_pool_size）
+    'http_retries': 3,  # 网络错误和5xx响应的重试次数
+    'http_backoff': 0.5,  # 重试退避系数（秒）
+    'http_timeout': 30,  # 单次请求超时（秒）
+    'http_cache_path': './cache/github_http.sqlite',  # ETag条件请求缓存文件，设为None关闭
+    'details_backend': 'rest',  # 仓库详情的获取方式：rest（逐个请求）或 graphql（批量获取README和star数）
+    'graphql_url': 'https://api.github.com/graphql',  # 测试时可指向本地桩服务器
+    'star_history_mode': 'parallel',  # star历史获取方式：sequential / parallel / sampled
+    'star_history_workers': 8,  # 并发获取stargazers页的线程数
+    'star_sample_pages': 50,  # 抽样模式下获取的页数
+    'star_parallel_max_pages': 100,  # parallel模式下超过该页数（接口上限为400页）时改为抽样获取
+    'incremental_star_history': True,  # 缓存过期时只从最后一页向前增量获取新的star
+    'cache_max_age_days': 1,  # Qdrant中last_updated在该天数之内的仓库视为新鲜
+    'change_detection': True,  # pushed_at未变化时不重新获取README和贡献者，star数未变化时不重新获取star历史
+    'max_contributors': 100,  # 每个仓库只保存贡献最多的前N位，None表示保存全部
+    'contributor_workers': 4,  # 并发获取贡献者分页的线程数
+    'detail_api_budget': 4500,  # 每次运行详情刷新可使用的GitHub API请求数（估算），None表示不限
+    'detail_max_staleness_hours': 24 * 7,  # 陈旧度上限，从未获取过详情的仓库按该值计算优先级
+    # 批量获取仓库详情时各阶段的线程数，以及阶段之间队列的容量
+    'detail_stage_workers': {'readme': 4, 'contributors': 4, 'stars': 4, 'embed': 2, 'persist': 1},
+    'detail_queue_size': 16,
     'headers': {
         'Authorization': 'your_github_token',
         'Accept': 'application/vnd.github.v3+json'
-    }
+    },
+    # 访问令牌池，格式同headers中的Authorization；每个令牌单独统计core和search额度，
+    # 请求时自动选择剩余额度最多的令牌。为空时只使用headers中的令牌
+    'tokens': []
 }
 
 # 数据库配置
@@ -32,10 +59,36 @@ API_KEYS = {
     'qwen_api_key': 'your_api_key'
 }
 
+# 嵌入模型配置
+# Embedding Configuration
+EMBEDDING_SETTINGS = {
+    # remote: DashScope text-embedding-v3；local: 本地CPU上的ONNX模型（需安装onnxruntime和tokenizers）
+    # 采集和检索必须使用同一个后端，切换后端需要重建Qdrant集合
+    'embedding_backend': 'remote',
+    'embedding_base_url': 'https://dashscope.aliyuncs.com/compatible-mode/v1',
+    'embedding_model': 'text-embedding-v3',
+    'embedding_dimensions': 1024,
+    'embedding_batch_size': 10,  # 每个请求包含的文本数，text-embedding-v3单次最多10条
+    'embedding_workers': 2,  # 并发请求数
+    'embedding_encoding_format': 'float',  # float 或 base64，base64的响应体更小，需确认接口支持
+    'embedding_local_model_dir': './models/bge-small-zh-v1.5',  # 包含ONNX模型和tokenizer.json的目录
+    'embedding_local_model_file': 'model_quantized.onnx',
+    'embedding_local_pooling': 'cls',  # cls 或 mean，与模型的训练方式一致
+    'embedding_local_batch_size': 32,
+    'embedding_local_max_length': 512,
+    'embedding_local_threads': 0,  # 0表示使用全部CPU核心
+    # README切分为相互重叠的片段，每个片段单独存为片段集合中的一个点
+    'chunk_collection': 'github_repo_chunks',
+    'readme_chunk_size': 1000,
+    'readme_chunk_overlap': 200,
+    'readme_max_chunks': 50
+}
+
 # 合并所有配置到一个字典
 # Merge all configurations into one dictionary
 DEFAULT_SETTINGS = {
     **GITHUB_SETTINGS,
     **DB_SETTINGS,
-    **API_KEYS
+    **API_KEYS,
+    **EMBEDDING_SETTINGS
 }
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+MySQL批量写入工具
+Batched MySQL write helpers
+
+把逐行的 INSERT ... ON DUPLICATE KEY UPDATE 合并为多行语句，减少数据库往返次数
+"""
+
+
+def bulk_upsert(cursor, table, columns, rows, update_clause, batch_size=500):
+    """
+    多行 INSERT ... ON DUPLICATE KEY UPDATE
+
+    参数:
+        cursor: 数据库游标
+        table: 表名
+        columns: 列名列表
+        rows: 与columns顺序一致的值元组列表
+        update_clause: ON DUPLICATE KEY UPDATE 之后的语句
+        batch_size: 每条语句最多包含的行数，避免超过max_allowed_packet
+
+    返回:
+        受影响行数之和（MySQL中新插入计1，更新计2，未变化计0）
+    """
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    affected = 0
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        query = f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES {", ".join([placeholders] * len(batch))}
+        ON DUPLICATE KEY UPDATE {update_clause}
+        """
+        cursor.execute(query, [value for row in batch for value in row])
+        affected += cursor.rowcount
+
+    return affected
+
+
+def existing_keys(cursor, table, key_column, keys, batch_size=500):
+    """查询已存在于表中的键，返回小写后的集合（MySQL默认排序规则不区分大小写）"""
+    found = set()
+    keys = list(keys)
+
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        query = f"SELECT {key_column} FROM {table} WHERE {key_column} IN ({', '.join(['%s'] * len(batch))})"
+        cursor.execute(query, batch)
+        found.update(str(row[0]).lower() for row in cursor.fetchall())
+
+    return found
+
+
+def existing_values(cursor, table, key_column, value_column, keys, batch_size=500):
+    """查询已存在的键及其某一列的值，返回 {小写后的键: 值}"""
+    found = {}
+    keys = list(keys)
+
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        query = f"SELECT {key_column}, {value_column} FROM {table} WHERE {key_column} IN ({', '.join(['%s'] * len(batch))})"
+        cursor.execute(query, batch)
+        found.update((str(row[0]).lower(), row[1]) for row in cursor.fetchall())
+
+    return found
@@ -0,0 +1,216 @@
+"""
+文本嵌入后端
+Pluggable text embedding backends
+
+采集（tools/get_data.py）和检索（app/utils/retriever.py）通过 get_embedding_backend 共用同一个后端：
+- remote: DashScope兼容OpenAI接口的 text-embedding-v3，多条文本一个请求，多个请求并发
+- local: 本地CPU上运行的ONNX模型（可使用量化模型），进程内只加载一次，按批推理
+
+嵌入失败时抛出 EmbeddingError，不再用全零向量代替，避免污染向量索引。
+"""
+import array
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.config import DEFAULT_SETTINGS
+
+
+class EmbeddingError(Exception):
+    """创建嵌入向量失败"""
+
+
+class EmbeddingBackend:
+    """
+    嵌入后端接口
+
+    子类需要设置 dimensions（向量维度）和 model_key（模型标识，用于嵌入缓存和Qdrant payload），
+    并实现 _embed_batch(texts)
+    """
+
+    dimensions = None
+    model_key = None
+    batch_size = 10
+
+    def _embed_batch(self, texts):
+        raise NotImplementedError
+
+    def embed(self, texts):
+        """
+        批量创建文本嵌入
+
+        参数:
+            texts: 文本列表，空文本对应全零向量（没有README的仓库仍需要一个占位点）
+
+        返回:
+            与texts顺序一致的嵌入向量列表
+
+        异常:
+            EmbeddingError: 任意一批文本嵌入失败
+        """
+        vectors = [[0.0] * self.dimensions for _ in texts]
+        indices = [i for i, text in enumerate(texts) if text]
+        for batch, batch_vectors in self._run_batches(texts, indices):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
+    def _run_batches(self, texts, indices):
+        """按batch_size顺序处理，子类可改为并发"""
+        for start in range(0, len(indices), self.batch_size):
+            batch = indices[start:start + self.batch_size]
+            yield batch, self._embed_checked([texts[i] for i in batch])
+
+    def _embed_checked(self, texts):
+        try:
+            vectors = self._embed_batch(texts)
+        except EmbeddingError:
+            raise
+        except Exception as e:
+            raise EmbeddingError(f"创建嵌入向量失败: {str(e)}") from e
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"嵌入结果数量不符: 期望 {len(texts)}，实际 {len(vectors)}")
+        return vectors
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """DashScope text-embedding-v3（OpenAI兼容接口）"""
+
+    def __init__(self, SETTINGS=DEFAULT_SETTINGS):
+        from openai import OpenAI
+
+        self.client = OpenAI(
+            api_key=SETTINGS.get('qwen_api_key'),
+            base_url=SETTINGS.get('embedding_base_url', "https://dashscope.aliyuncs.com/compatible-mode/v1")
+        )
+        self.model = SETTINGS.get('embedding_model', "text-embedding-v3")
+        self.dimensions = SETTINGS.get('embedding_dimensions', 1024)
+        self.batch_size = SETTINGS.get('embedding_batch_size', 10)
+        self.workers = SETTINGS.get('embedding_workers', 2)
+        self.encoding_format = SETTINGS.get('embedding_encoding_format', 'float')
+        self.model_key = f"{self.model}/{self.dimensions}"
+
+    @staticmethod
+    def _decode(embedding):
+        """base64格式的嵌入是小端float32数组，float格式直接返回"""
+        if isinstance(embedding, str):
+            return array.array('f', base64.b64decode(embedding)).tolist()
+        return embedding
+
+    def _embed_batch(self, texts):
+        # 截取文本以适应API限制
+        completion = self.client.embeddings.create(
+            model=self.model,
+            input=[text[:8000] for text in texts],
+            dimensions=self.dimensions,
+            encoding_format=self.encoding_format
+        )
+        vectors = [None] * len(texts)
+        for item in completion.data:
+            vectors[item.index] = self._decode(item.embedding)
+        return vectors
+
+    def _run_batches(self, texts, indices):
+        """多个请求并发发送，远程接口的耗时主要是网络延迟"""
+        batches = [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._embed_checked, [texts[i] for i in batch]) for batch in batches]
+            for batch, future in zip(batches, futures):
+                yield batch, future.result()
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    本地CPU上的ONNX嵌入模型
+
+    模型目录中需要有ONNX模型文件和tokenizer.json（如导出的bge-small-zh-v1.5），
+    依赖 onnxruntime 和 tokenizers，只在使用本地后端时才需要安装
+    """
+
+    def __init__(self, SETTINGS=DEFAULT_SETTINGS):
+        try:
+            import numpy as np
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise EmbeddingError("本地嵌入后端需要安装 onnxruntime 和 tokenizers") from e
+
+        self.np = np
+        model_dir = SETTINGS.get('embedding_local_model_dir', './models/bge-small-zh-v1.5')
+        model_file = SETTINGS.get('embedding_local_model_file', 'model_quantized.onnx')
+        self.pooling = SETTINGS.get('embedding_local_pooling', 'cls')
+        self.batch_size = SETTINGS.get('embedding_local_batch_size', 32)
+
+        options = onnxruntime.SessionOptions()
+        # 0表示使用全部CPU核心
+        options.intra_op_num_threads = SETTINGS.get('embedding_local_threads', 0)
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=SETTINGS.get('embedding_local_max_length', 512))
+        self.tokenizer.enable_padding()
+
+        # 输出维度可能是符号维度，用一条探测文本确定
+        self.dimensions = len(self._embed_batch(["dimension probe"])[0])
+        self.model_key = f"local:{os.path.basename(os.path.normpath(model_dir))}/{model_file}/{self.dimensions}"
+
+    def _embed_batch(self, texts):
+        np = self.np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        output = self.session.run(None, feeds)[0]
+
+        # 输出为token级隐藏状态时做池化，已是句向量时直接使用
+        if output.ndim == 3:
+            if self.pooling == "mean":
+                mask = attention_mask[:, :, None].astype(output.dtype)
+                output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            else:
+                output = output[:, 0]
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.maximum(norms, 1e-12)).tolist()
+
+    def _run_batches(self, texts, indices):
+        """按长度排序后分批，同一批内的文本长度相近，减少padding带来的无效计算"""
+        indices = sorted(indices, key=lambda i: len(texts[i]))
+        return super()._run_batches(texts, indices)
+
+
+EMBEDDING_BACKENDS = {
+    "remote": RemoteEmbeddingBackend,
+    "local": LocalEmbeddingBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(SETTINGS=DEFAULT_SETTINGS):
+    """
+    获取进程内共享的嵌入后端，同一配置只创建（加载模型）一次
+
+    SETTINGS['embedding_backend'] 为 remote 或 local，采集和检索必须使用同一个后端
+    """
+    name = SETTINGS.get('embedding_backend', 'remote')
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"未知的嵌入后端: {name}")
+
+    if name == "local":
+        key = (name, SETTINGS.get('embedding_local_model_dir'), SETTINGS.get('embedding_local_model_file'))
+    else:
+        key = (name, SETTINGS.get('qwen_api_key'), SETTINGS.get('embedding_model'), SETTINGS.get('embedding_dimensions'))
+
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = EMBEDDING_BACKENDS[name](SETTINGS)
+        return _backends[key]
@@ -1,8 +1,10 @@
-import requests
 import time
-import random
+import math
+import array
 import datetime
 import base64
+import hashlib
+import threading
 import mysql.connector
 import datetime
 
@@ -11,10 +13,20 @@ import pandas as pd
 from tqdm import tqdm
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import parse_qs, urlparse
 
 # 导入配置项
 from tools.config import DEFAULT_SETTINGS
+from tools.github_client import get_default_client, GithubRequestError
+from tools.graphql_fetcher import fetch_repos_graphql
+from tools.pipeline import StagePipeline
+from tools.db_writer import bulk_upsert, existing_values
+from tools.embeddings import get_embedding_backend
+from tools.migrations import migrate
+from tools.topics import split_topics, sync_repo_topics
+from tools.rollups import refresh_rollups
+from tools.top_contributors import update_repo_contributor_scores, refresh_contributor_totals
 
 def conn_init(SETTINGS=DEFAULT_SETTINGS):
     """初始化数据库连接"""
@@ -28,8 +40,8 @@ def conn_init(SETTINGS=DEFAULT_SETTINGS):
     )
     return conn
 
-def create_tables():
-    """创建必要的数据库表"""
+def create_tables(silence=True):
+    """创建必要的数据库表，并执行尚未应用的结构迁移（tools/migrations.py）"""
     # 连接到MySQL服务器
     conn = conn_init()
     cursor = conn.cursor()
@@ -58,6 +70,22 @@ def create_tables():
     )
     """)
     
+    # 创建crawl_state表，记录get_top_starred_repos每个时间段的进度
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS crawl_state (
+        crawl_key VARCHAR(255),
+        window_start DATE,
+        window_end DATE,
+        last_page INT,
+        end_page INT,
+        records_total INT,
+        records_new INT,
+        records_updated INT,
+        updated_at DATETIME,
+        PRIMARY KEY (crawl_key, window_start, window_end)
+    )
+    """)
+    
     # 创建log表
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS log (
@@ -69,6 +97,17 @@ def create_tables():
     )
     """)
     
+    # 创建embedding_cache表，按README内容哈希和嵌入模型缓存向量（float32数组）
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        content_hash CHAR(64) NOT NULL,
+        model_key VARCHAR(150) NOT NULL,
+        embedding MEDIUMBLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, model_key)
+    )
+    """)
+    
     # 创建repo_qdrant_mapping表
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS repo_qdrant_mapping (
@@ -83,9 +122,12 @@ def create_tables():
     
     conn.commit()
     cursor.close()
+    
+    # 索引等后续结构变更按版本号执行
+    migrate(conn, silence=silence)
     conn.close()
 
-def get_repo_count(SETTINGS=DEFAULT_SETTINGS, min_stars=100, create_date=None, query=None):
+def get_repo_count(SETTINGS=DEFAULT_SETTINGS, min_stars=100, create_date=None, query=None, client=None):
     """获取符合条件的仓库数量"""
     if not query:
         query = f"stars:>={min_stars}"
@@ -98,7 +140,8 @@ def get_repo_count(SETTINGS=DEFAULT_SETTINGS, min_stars=100, create_date=None, q
         "q": query,
         "per_page": 1  # 每页只返回1条结果，减少数据量
     }
-    response = requests.get(GITHUB_API_URL, headers=SETTINGS['headers'], params=params)
+    client = client or get_default_client(SETTINGS)
+    response = client.get(GITHUB_API_URL, params=params, resource="search")
     if response.status_code == 200:
         data = response.json()
         return data["total_count"]  # 返回符合条件的仓库总数
@@ -140,9 +183,9 @@ def format_datetime(dt_str):
         print(f"日期转换错误: {dt_str}, 错误: {str(e)}")
         return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def search_github_repos(query, page=1, SETTINGS=DEFAULT_SETTINGS):
+def search_github_repos(query, page=1, SETTINGS=DEFAULT_SETTINGS, client=None):
     """
-    搜索GitHub仓库
+    搜索GitHub仓库，速率限制由客户端统一等待处理
     """
     GITHUB_API_URL = "https://api.github.com/search/repositories"
     
@@ -154,17 +197,10 @@ def search_github_repos(query, page=1, SETTINGS=DEFAULT_SETTINGS):
         "page": page
     }
     
+    client = client or get_default_client(SETTINGS)
+    
     try:
-        response = requests.get(GITHUB_API_URL, headers=SETTINGS['headers'], params=params)
-        
-        # 检查是否达到API速率限制
-        if response.status_code == 403 and 'X-RateLimit-Remaining' in response.headers and int(response.headers['X-RateLimit-Remaining']) == 0:
-            reset_time = int(response.headers['X-RateLimit-Reset'])
-            sleep_time = reset_time - time.time() + 10  # 加10秒作为缓冲
-            if sleep_time > 0:
-                print(f"达到API速率限制，等待 {sleep_time:.0f} 秒后继续...")
-                time.sleep(sleep_time)
-                return search_github_repos(query, page, SETTINGS)
+        response = client.get(GITHUB_API_URL, params=params, resource="search")
         
         # 处理其他HTTP错误
         if response.status_code != 200:
@@ -178,35 +214,277 @@ def search_github_repos(query, page=1, SETTINGS=DEFAULT_SETTINGS):
         return None
 
 
-def get_top_starred_repos(query=None, start_date='2010-01-01', end_date='2025-01-01', SETTINGS=DEFAULT_SETTINGS, start_page=1, max_pages=10):
+# Search API 对每个查询最多返回1000条结果
+SEARCH_RESULT_CAP = 1000
+
+def _window_query(window, SETTINGS):
+    """构建时间段的查询条件：stars数量大于等于min_stars，且创建时间在指定时间段"""
+    window_start, window_end = window
+    return f"stars:>={SETTINGS['min_stars']} created:{window_start:%Y-%m-%d}..{window_end:%Y-%m-%d}"
+
+def _bisect_window(window):
+    """将时间段从中间一分为二"""
+    window_start, window_end = window
+    middle = window_start + (window_end - window_start) // 2
+    return (window_start, middle), (middle + datetime.timedelta(days=1), window_end)
+
+def _crawl_key(start_date, SETTINGS):
+    """
+    断点记录的键，同一组查询条件和开始日期共用一份断点
+
+    键中不包含结束日期：结束日期通常是运行当天，第二天继续时已记录的时间段仍然有效，
+    结束日期推后多出的日期范围作为未覆盖的部分重新探测
+    """
+    return f"stars>={SETTINGS['min_stars']}:{start_date}"
+
+def _load_crawl_state(cursor, crawl_key, end_date_obj):
+    """读取已记录的、从结束日期之前开始的时间段进度，返回 {(开始日期, 结束日期): 进度} 字典"""
+    cursor.execute("""
+        SELECT window_start, window_end, last_page, end_page, records_total, records_new, records_updated
+        FROM crawl_state
+        WHERE crawl_key = %s AND window_start <= %s
+    """, (crawl_key, end_date_obj))
+    return {
+        (row[0], row[1]): {
+            "last_page": row[2],
+            "end_page": row[3],
+            "done": set(),
+            "total": row[4],
+            "new": row[5],
+            "updated": row[6]
+        }
+        for row in cursor.fetchall()
+    }
+
+def _save_crawl_checkpoint(cursor, crawl_key, window, state):
+    """写入时间段的断点（不提交事务，和当页数据一起提交）"""
+    cursor.execute("""
+        INSERT INTO crawl_state
+        (crawl_key, window_start, window_end, last_page, end_page, records_total, records_new, records_updated, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_page = VALUES(last_page),
+            end_page = VALUES(end_page),
+            records_total = VALUES(records_total),
+            records_new = VALUES(records_new),
+            records_updated = VALUES(records_updated),
+            updated_at = VALUES(updated_at)
+    """, (crawl_key, window[0], window[1], state["last_page"], state["end_page"],
+          state["total"], state["new"], state["updated"], datetime.datetime.now()))
+
+def _uncovered_windows(start_date_obj, end_date_obj, windows):
+    """找出日期范围内没有被已记录时间段覆盖的部分"""
+    gaps = []
+    next_start = start_date_obj
+    for window_start, window_end in sorted(windows):
+        if window_start > next_start:
+            gaps.append((next_start, window_start - datetime.timedelta(days=1)))
+        next_start = max(next_start, window_end + datetime.timedelta(days=1))
+    if next_start <= end_date_obj:
+        gaps.append((next_start, end_date_obj))
+    return gaps
+
+# 没有Retry-After头的403/429（二级速率限制）重试前等待的秒数，按重试次数递增
+SECONDARY_LIMIT_WAIT = 60
+
+def _search_page(query, page, SETTINGS, client, delay=0):
+    """
+    通过共享客户端请求一页搜索结果
+    遇到速率限制时由客户端的速率预算负责等待，然后重试当前页；
+    delay为重试失败的页之前先等待的秒数
+    """
+    if delay:
+        time.sleep(delay)
+    url = "https://api.github.com/search/repositories"
+    params = {
+        "q": query,
+        "sort": SETTINGS['sort'],
+        "order": SETTINGS['order'],
+        "per_page": SETTINGS['perpage'],
+        "page": page
+    }
+    return client.get(url, params=params, resource="search")
+
+REPO_COLUMNS = [
+    "name", "url", "description", "stars", "stars_last_update", "forks", "language", "created_at", "updated_at",
+    "topics", "size", "homepage", "owner_type", "pushed_at"
+]
+
+REPO_UPDATE_CLAUSE = """
+    name = VALUES(name),
+    description = VALUES(description),
+    stars_last_update = stars,
+    stars = VALUES(stars),
+    forks = VALUES(forks),
+    language = VALUES(language),
+    updated_at = VALUES(updated_at),
+    topics = VALUES(topics),
+    size = VALUES(size),
+    homepage = VALUES(homepage),
+    owner_type = VALUES(owner_type),
+    pushed_at = VALUES(pushed_at)
+"""
+
+def _repo_row(repo):
+    """将API返回的仓库数据转换为repositories表的一行"""
+    # 处理可能的NULL值
+    description = repo.get("description", "")
+    if description is None:
+        description = ""
+    
+    language = repo.get("language", "")
+    if language is None:
+        language = ""
+        
+    # 处理topics（列表转为逗号分隔的字符串）
+    topics = ",".join(repo.get("topics", []))
+    
+    # 处理homepage
+    homepage = repo.get("homepage", "")
+    if homepage is None:
+        homepage = ""
+    
+    # 获取owner_type
+    owner_type = repo.get("owner", {}).get("type", "")
+    
+    return (
+        repo.get("full_name", ""),
+        repo.get("html_url", ""),
+        description,
+        repo.get("stargazers_count", 0),
+        0,  # 对于新记录，stars_last_update 设为 0
+        repo.get("forks_count", 0),
+        language,
+        format_datetime(repo.get("created_at", "")),
+        format_datetime(repo.get("updated_at", "")),
+        topics,
+        repo.get("size", 0),
+        homepage,
+        owner_type,
+        format_datetime(repo.get("pushed_at", ""))
+    )
+
+def _record_repo_error(error_data, name, url, error, page):
+    """记录写入失败的仓库"""
+    error_info = {
+        "repo": name,
+        "url": url,
+        "error": str(error),
+        "page": page
+    }
+    error_data.append(error_info)
+    print(f"处理数据出错: {error_info['repo']}, 错误: {str(error)}")
+
+def _sync_page_topics(cursor, rows, page):
+    """同步已写入仓库的topics到repo_topics，失败时只打印错误，不影响仓库数据"""
+    topics_index = REPO_COLUMNS.index("topics")
+    try:
+        sync_repo_topics(cursor, {row[1]: split_topics(row[topics_index]) for row in rows})
+    except Exception as e:
+        print(f"第 {page} 页topics同步失败: {str(e)}")
+
+def _sync_page_contributor_scores(cursor, rows, previous_stars, page):
+    """star数变化的已有仓库重新分配贡献者排行的star，失败时只打印错误"""
+    stars_index = REPO_COLUMNS.index("stars")
+    changed = [row[1] for row in rows
+               if row[1].lower() in previous_stars and previous_stars[row[1].lower()] != row[stars_index]]
+    try:
+        repo_ids = existing_values(cursor, "repositories", "url", "id", changed) if changed else {}
+        update_repo_contributor_scores(cursor, repo_ids.values())
+    except Exception as e:
+        print(f"第 {page} 页贡献者排行更新失败: {str(e)}")
+
+def _save_repos_page(cursor, repos, page, stats, error_data):
+    """
+    批量写入一页仓库数据，使用多行 INSERT ... ON DUPLICATE KEY UPDATE
+    
+    写入前查询已存在的url以区分新增和更新：新增行的受影响数为1，更新行为2；
+    批量语句失败时退回逐行写入，以便定位并记录出错的行；
+    写入后同步这些仓库的topics到repo_topics，并为star数变化的仓库更新贡献者排行
+    """
+    rows = []
+    for repo in repos:
+        try:
+            rows.append(_repo_row(repo))
+        except Exception as e:
+            _record_repo_error(error_data, repo.get("full_name", ""), repo.get("html_url", ""), e, page)
+    
+    if not rows:
+        return
+    
+    previous_stars = {}
+    try:
+        # 已存在仓库写入前的star数，同时用于区分新增和更新
+        previous_stars = existing_values(cursor, "repositories", "url", "stars", [row[1] for row in rows])
+        existing = previous_stars.keys()
+        affected = bulk_upsert(cursor, "repositories", REPO_COLUMNS, rows, REPO_UPDATE_CLAUSE)
+        
+        new_count = sum(1 for row in rows if row[1].lower() not in existing)
+        stats["new"] += new_count
+        stats["updated"] += (affected - new_count) // 2
+        stats["total"] += len(rows)
+        _sync_page_topics(cursor, rows, page)
+        _sync_page_contributor_scores(cursor, rows, previous_stars, page)
+        return
+    except Exception as e:
+        print(f"第 {page} 页批量写入失败，改为逐条写入: {str(e)}")
+    
+    saved = []
+    for row in rows:
+        try:
+            affected = bulk_upsert(cursor, "repositories", REPO_COLUMNS, [row], REPO_UPDATE_CLAUSE)
+            
+            # 检查是插入新记录还是更新已有记录
+            if affected == 1:
+                stats["new"] += 1
+            elif affected == 2:  # MySQL对于ON DUPLICATE KEY UPDATE，如果更新了记录，rowcount为2
+                stats["updated"] += 1
+            
+            stats["total"] += 1
+            saved.append(row)
+        except Exception as e:
+            _record_repo_error(error_data, row[0], row[1], e, page)
+    
+    _sync_page_topics(cursor, saved, page)
+    _sync_page_contributor_scores(cursor, saved, previous_stars, page)
+
+def get_top_starred_repos(query=None, start_date='2010-01-01', end_date='2025-01-01', SETTINGS=DEFAULT_SETTINGS, start_page=1, max_pages=10, workers=None, client=None, resume=False):
     """
     获取 GitHub 上 star 数超过指定数量的仓库，并动态保存到MySQL数据库
     如果记录已存在，则只更新变动的值
     
+    日期范围按结果数自适应二分，保证每个时间段不超过Search API的1000条上限；
+    多个时间段和页面由线程池并发获取，所有线程共用一个速率预算，
+    额度由响应头实时刷新，用尽时统一等待重置而不是等到403再处理；
+    数据库写入只在主线程进行；每提交一页就在crawl_state表中记录该时间段的进度，
+    resume=True时跳过已完成的时间段，未完成的时间段从断点页继续；
+    断点按开始日期记录，结束日期推后（如第二天继续）时只探测新增的日期范围；
+    失败的探测或分页最多重试 SETTINGS['crawl_retries'] 次，仍失败的记入返回的error_df
+    
     参数:
         start_date: 开始日期，格式为 "YYYY-MM-DD"
         end_date: 结束日期，格式为 "YYYY-MM-DD"
         SETTINGS: 配置字典，包含各种参数
         max_pages: 最大获取页数，默认为 10
+        workers: 并发请求的线程数，默认取 SETTINGS['crawl_workers']
+        client: 共享的GithubClient，默认使用进程内的默认客户端
+        resume: 是否从上次中断的位置继续，默认为False（清空断点重新获取）
     
     返回:
         包含写入和更新记录数以及错误数据的字典
     """
     # 导入math模块用于向上取整
     import math
-    import calendar
+    
+    workers = workers or SETTINGS.get('crawl_workers', 1)
+    client = client or get_default_client(SETTINGS)
     
     # 连接MySQL
     conn = conn_init()
     cursor = conn.cursor()
     
-    # GitHub API 搜索端点
-    url = "https://api.github.com/search/repositories"
-    
     # 记录写入和更新的数量
-    total_records = 0
-    new_records = 0
-    updated_records = 0
+    stats = {"total": 0, "new": 0, "updated": 0}
     
     # 创建错误数据的列表
     error_data = []
@@ -214,241 +492,130 @@ def get_top_starred_repos(query=None, start_date='2010-01-01', end_date='2025-01
     start_date_obj = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
     end_date_obj = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
     
-    # 计算开始和结束的年月
-    start_year, start_month = start_date_obj.year, start_date_obj.month
-    end_year, end_month = end_date_obj.year, end_date_obj.month
-    
-    # 定义月内的时间段
-    periods = [
-        (1, 7),    # 1-7日
-        (8, 14),   # 8-14日
-        (15, 21),  # 15-21日
-        (22, 31)   # 22日-月末（这里用31作为占位符，后面会根据实际月份调整）
-    ]
+    # 读取或清空断点；断点中的记录数是尚未计入log表的部分，已完成并记录日志的获取不会重复累计
+    crawl_key = _crawl_key(start_date, SETTINGS)
+    if resume:
+        states = _load_crawl_state(cursor, crawl_key, end_date_obj)
+        for state in states.values():
+            for key in ("total", "new", "updated"):
+                stats[key] += state[key]
+        print(f"从断点继续: 已记录 {len(states)} 个时间段，已处理 {stats['total']} 条记录")
+    else:
+        cursor.execute("DELETE FROM crawl_state WHERE crawl_key = %s", (crawl_key,))
+        conn.commit()
+        states = {}
     
-    # 第一层循环：按月遍历
-    current_year, current_month = start_year, start_month
+    print(f"日期范围: {start_date} 到 {end_date}，使用 {workers} 个线程并发获取")
     
-    while (current_year < end_year) or (current_year == end_year and current_month <= end_month):
-        # 获取当月的最后一天
-        _, last_day_of_month = calendar.monthrange(current_year, current_month)
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=0, desc="获取仓库数据") as pbar:
+        # 从整个日期范围开始，请求第1页作为探测；结果数超过上限时二分，
+        # 未超过上限的时间段直接复用第1页的数据和total_count，稀疏的时间段不会被继续拆分
+        pending = {}
+        attempts = {}
+        max_retries = SETTINGS.get('crawl_retries', 3)
         
-        # 第二层循环：按月内时间段遍历
-        for period_start, period_end in periods:
-            # 调整时间段的结束日期，不能超过月末
-            actual_period_end = min(period_end, last_day_of_month)
-            
-            # 如果时间段的开始日期已经超过月末，跳过此时间段
-            if period_start > last_day_of_month:
-                continue
+        def submit(window, page, delay=0):
+            future = executor.submit(_search_page, _window_query(window, SETTINGS), page, SETTINGS, client, delay)
+            pending[future] = (window, page)
+            pbar.total += 1
+            pbar.refresh()
+        
+        def retry_or_record(window, page, window_label, error, status_code=None):
+            """失败的探测或分页重新提交，超过重试次数后记入错误数据，不会被静默丢弃"""
+            attempts[(window, page)] = attempts.get((window, page), 0) + 1
+            attempt = attempts[(window, page)]
+            if attempt <= max_retries:
+                if status_code in (403, 429):
+                    delay = SECONDARY_LIMIT_WAIT * attempt
+                else:
+                    delay = SETTINGS.get('http_backoff', 0.5) * 2 ** attempt
+                print(f"{window_label} 第 {page} 页失败，{delay:.0f} 秒后第 {attempt} 次重试: {error}")
+                submit(window, page, delay)
+                return
+            error_data.append({"repo": "", "url": "", "error": str(error), "page": page, "window": window_label})
+            print(f"{window_label} 第 {page} 页重试 {max_retries} 次后仍失败，已记入错误数据: {error}")
+        
+        # 未完成的时间段从断点页继续，没有记录的日期范围重新探测
+        for window, state in states.items():
+            for next_page in range(state["last_page"] + 1, state["end_page"] + 1):
+                submit(window, next_page)
+        for window in _uncovered_windows(start_date_obj, end_date_obj, states):
+            submit(window, 1)
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window, page = pending.pop(future)
+                window_label = f"{window[0]:%Y-%m-%d}..{window[1]:%Y-%m-%d}"
+                pbar.update(1)
                 
-            # 创建当前时间段的开始和结束日期
-            try:
-                period_start_date = datetime.date(current_year, current_month, period_start)
-                period_end_date = datetime.date(current_year, current_month, actual_period_end)
-            except ValueError as e:
-                print(f"日期创建错误: {e}, 年:{current_year}, 月:{current_month}, 日:{period_start}-{actual_period_end}")
-                continue
-            
-            # 如果是开始月份且时间段开始日期早于指定的开始日期，调整时间段开始日期
-            if current_year == start_year and current_month == start_month and period_start_date < start_date_obj:
-                if start_date_obj > period_end_date:
-                    # 如果整个时间段都在开始日期之前，跳过此时间段
-                    continue
-                period_start_date = start_date_obj
-            
-            # 如果是结束月份且时间段结束日期晚于指定的结束日期，调整时间段结束日期
-            if current_year == end_year and current_month == end_month and period_end_date > end_date_obj:
-                if end_date_obj < period_start_date:
-                    # 如果整个时间段都在结束日期之后，跳过此时间段
-                    continue
-                period_end_date = end_date_obj
-            
-            # 格式化日期为GitHub API查询格式
-            period_start_str = period_start_date.strftime("%Y-%m-%d")
-            period_end_str = period_end_date.strftime("%Y-%m-%d")
-            
-            # 构建查询条件：stars数量大于等于min_stars，且创建时间在指定时间段
-            query = f"stars:>={SETTINGS['min_stars']} created:{period_start_str}..{period_end_str}"
-            
-            print(f"\n开始获取 {current_year}-{current_month:02d} 的 {period_start_date.day}-{period_end_date.day} 日创建的仓库数据...")
-            print(f"日期范围: {period_start_str} 到 {period_end_str}")
-            
-            # 获取符合条件的仓库总数
-            params = {
-                "q": query,
-                "per_page": 1
-            }
-            response = requests.get(url, headers=SETTINGS['headers'], params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                repo_count = data.get("total_count", 0)
-                print(f"{current_year}-{current_month:02d} 的 {period_start_date.day}-{period_end_date.day} 日符合条件的仓库总数: {repo_count}")
-            else:
-                print(f"获取仓库数量失败，状态码: {response.status_code}")
-                print(f"错误信息: {response.text}")
-                # 如果是因为 API 速率限制而失败，等待一段时间后重试
-                if response.status_code == 403:
-                    reset_time = int(response.headers.get('X-RateLimit-Reset', 0))
-                    wait_time = max(reset_time - time.time(), 0) + 1
-                    print(f"API 速率限制已达到，等待 {wait_time:.0f} 秒后重试...")
-                    time.sleep(wait_time)
-                    # 重试当前时间段
+                try:
+                    response = future.result()
+                except Exception as e:
+                    retry_or_record(window, page, window_label, f"请求异常: {e}")
                     continue
-                else:
-                    # 跳过当前时间段
+                
+                if response.status_code != 200:
+                    retry_or_record(window, page, window_label, f"状态码 {response.status_code}: {response.text[:200]}",
+                                    response.status_code)
                     continue
-            
-            # 如果没有符合条件的仓库，跳过当前时间段
-            if repo_count == 0:
-                print(f"{current_year}-{current_month:02d} 的 {period_start_date.day}-{period_end_date.day} 日没有符合条件的仓库，跳过")
-                continue
                 
-            # 计算最大页数 (每页100条，向上取整)
-            calculated_max_pages = math.ceil(repo_count / SETTINGS['perpage'])
-            # 使用计算出的页数和用户指定的max_pages中较小的一个
-            actual_max_pages = min(calculated_max_pages, max_pages)
-            
-            # 计算结束页码
-            end_page = start_page + actual_max_pages - 1
-            
-            print(f"{current_year}-{current_month:02d} 的 {period_start_date.day}-{period_end_date.day} 日将获取 {start_page} 到 {end_page} 页的数据 (共 {actual_max_pages} 页)")
-            
-            # 第三层循环：分页获取数据
-            for page in tqdm(range(start_page, end_page + 1), desc=f"获取 {current_year}-{current_month:02d} 的 {period_start_date.day}-{period_end_date.day} 日的仓库数据"):
-                params = {
-                    "q": query,
-                    "sort": SETTINGS['sort'],
-                    "order": SETTINGS['order'],
-                    "per_page": SETTINGS['perpage'],  # 每页最多 100 条结果
-                    "page": page
-                }
-            
-                # 发送请求
-                response = requests.get(url, headers=SETTINGS['headers'], params=params)
+                data = response.json()
                 
-                # 检查请求是否成功
-                if response.status_code == 200:
-                    data = response.json()
-                    repos = data.get("items", [])
+                if page == 1 and window not in states:
+                    repo_count = data.get("total_count", 0)
+                    
+                    if repo_count > SEARCH_RESULT_CAP and window[0] < window[1]:
+                        for half in _bisect_window(window):
+                            submit(half, 1)
+                        continue
                     
-                    # 如果没有更多仓库，退出循环
-                    if not repos:
-                        break
-                        
-                    # 逐条处理数据，使用INSERT ... ON DUPLICATE KEY UPDATE
-                    for repo in repos:
-                        try:
-                            # 处理可能的NULL值
-                            description = repo.get("description", "")
-                            if description is None:
-                                description = ""
-                            
-                            language = repo.get("language", "")
-                            if language is None:
-                                language = ""
-                                
-                            # 处理topics（列表转为逗号分隔的字符串）
-                            topics = ",".join(repo.get("topics", []))
-                            
-                            # 处理homepage
-                            homepage = repo.get("homepage", "")
-                            if homepage is None:
-                                homepage = ""
-                            
-                            # 获取owner_type
-                            owner_type = repo.get("owner", {}).get("type", "")
-                            
-                            # 使用INSERT ... ON DUPLICATE KEY UPDATE
-                            insert_query = """
-                            INSERT INTO repositories 
-                            (name, url, description, stars, stars_last_update, forks, language, created_at, updated_at, 
-                            topics, size, homepage, owner_type, pushed_at)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            ON DUPLICATE KEY UPDATE
-                                name = VALUES(name),
-                                description = VALUES(description),
-                                stars_last_update = stars,
-                                stars = VALUES(stars),
-                                forks = VALUES(forks),
-                                language = VALUES(language),
-                                updated_at = VALUES(updated_at),
-                                topics = VALUES(topics),
-                                size = VALUES(size),
-                                homepage = VALUES(homepage),
-                                owner_type = VALUES(owner_type),
-                                pushed_at = VALUES(pushed_at)
-                            """
-                            
-                            # 获取当前star数
-                            current_stars = repo.get("stargazers_count", 0)
-                            
-                            values = (
-                                repo.get("full_name", ""),
-                                repo.get("html_url", ""),
-                                description,
-                                current_stars,
-                                0,  # 对于新记录，stars_last_update 设为 0
-                                repo.get("forks_count", 0),
-                                language,
-                                format_datetime(repo.get("created_at", "")),
-                                format_datetime(repo.get("updated_at", "")),
-                                topics,
-                                repo.get("size", 0),
-                                homepage,
-                                owner_type,
-                                format_datetime(repo.get("pushed_at", ""))
-                            )
-                            
-                            cursor.execute(insert_query, values)
-                            
-                            # 检查是插入新记录还是更新已有记录
-                            if cursor.rowcount == 1:
-                                new_records += 1
-                            elif cursor.rowcount == 2:  # MySQL对于ON DUPLICATE KEY UPDATE，如果更新了记录，rowcount为2
-                                updated_records += 1
-                            
-                            total_records += 1
-                            
-                        except Exception as e:
-                            # 记录错误数据
-                            error_info = {
-                                "repo": repo.get("full_name", ""),
-                                "url": repo.get("html_url", ""),
-                                "error": str(e),
-                                "page": page
-                            }
-                            error_data.append(error_info)
-                            print(f"处理数据出错: {error_info['repo']}, 错误: {str(e)}")
+                    if repo_count > SEARCH_RESULT_CAP:
+                        print(f"{window_label} 单日仓库数 {repo_count} 超过搜索上限 {SEARCH_RESULT_CAP}，只能获取前 {SEARCH_RESULT_CAP} 条")
                     
-                    # 提交事务
+                    # 计算最大页数 (每页100条，向上取整)，取计算页数和max_pages中较小的一个
+                    actual_max_pages = min(math.ceil(min(repo_count, SEARCH_RESULT_CAP) / SETTINGS['perpage']), max_pages)
+                    
+                    # 记录时间段的计划页数，没有符合条件的仓库时直接记为已完成
+                    states[window] = {
+                        "last_page": start_page - 1 if actual_max_pages else 0,
+                        "end_page": start_page + actual_max_pages - 1 if actual_max_pages else 0,
+                        "done": set(),
+                        "total": 0,
+                        "new": 0,
+                        "updated": 0
+                    }
+                    _save_crawl_checkpoint(cursor, crawl_key, window, states[window])
                     conn.commit()
                     
-                    print(f"第 {page} 页: 处理了 {len(repos)} 条记录，新增: {new_records}，更新: {updated_records}，错误: {len(error_data)}")
+                    for next_page in range(max(start_page, 2), start_page + actual_max_pages):
+                        submit(window, next_page)
                     
-                    # GitHub API 有速率限制，添加延时避免触发限制
-                    time.sleep(random.uniform(1,2))
-                else:
-                    print(f"请求失败，状态码: {response.status_code}")
-                    print(f"错误信息: {response.text}")
-                    # 如果是因为 API 速率限制而失败，等待一段时间后重试
-                    if response.status_code == 403:
-                        reset_time = int(response.headers.get('X-RateLimit-Reset', 0))
-                        wait_time = max(reset_time - time.time(), 0) + 1
-                        print(f"API 速率限制已达到，等待 {wait_time:.0f} 秒后重试...")
-                        time.sleep(wait_time)
-                        # 重试当前页
-                        page -= 1
-                    else:
-                        break
-        
-        # 移动到下一个月
-        if current_month == 12 and current_year != end_year:
-            current_year += 1
-            current_month = 1
-        else:
-            current_month += 1
+                    if start_page > 1 or repo_count == 0:
+                        continue
+                
+                repos = data.get("items", [])
+                before = dict(stats)
+                _save_repos_page(cursor, repos, page, stats, error_data)
+                
+                # 更新时间段的断点：只推进到连续完成的最后一页
+                state = states[window]
+                for key in ("total", "new", "updated"):
+                    state[key] += stats[key] - before[key]
+                state["done"].add(page)
+                while state["last_page"] + 1 in state["done"]:
+                    state["last_page"] += 1
+                _save_crawl_checkpoint(cursor, crawl_key, window, state)
+                
+                # 提交事务，当页数据和断点一起提交
+                conn.commit()
+                
+                pbar.set_postfix({"新增": stats["new"], "更新": stats["updated"], "错误": len(error_data)})
+    
+    total_records = stats["total"]
+    new_records = stats["new"]
+    updated_records = stats["updated"]
+    
     try:
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_query = """
@@ -462,11 +629,20 @@ def get_top_starred_repos(query=None, start_date='2010-01-01', end_date='2025-01
         """
         cursor.execute(log_query, ("repositories", current_time, total_records, new_records, updated_records,
                                   total_records, new_records, updated_records))
+        # 这些记录数已计入log表，清零断点中的计数，之后resume时不再重复累计
+        cursor.execute("""
+            UPDATE crawl_state SET records_total = 0, records_new = 0, records_updated = 0
+            WHERE crawl_key = %s
+        """, (crawl_key,))
         conn.commit()
         print(f"日志表更新成功，记录时间: {current_time}")
     except Exception as e:
         print(f"更新日志表出错: {str(e)}")
 
+    # 重新计算看板使用的汇总表
+    if SETTINGS.get('refresh_rollups', True):
+        refresh_rollups(conn, silence=False)
+
     # 关闭数据库连接
     cursor.close()
     conn.close()
@@ -550,12 +726,18 @@ def clean_markdown(markdown_text):
     
     return text
 
-def get_readme(repo_name, headers):
-    """获取仓库的README内容"""
+def get_readme(repo_name, headers, client=None):
+    """
+    获取仓库的README内容，仓库没有README（404）时返回空字符串
+    
+    异常:
+        GithubRequestError: 其他非200状态码，调用方不应把空内容当作README写入
+    """
+    client = client or get_default_client()
     
     base_url = "https://api.github.com"
     readme_url = f"{base_url}/repos/{repo_name}/readme"
-    response = requests.get(readme_url, headers=headers)
+    response = client.get(readme_url, headers=headers, conditional=True)
     
     readme_content = ""
     if response.status_code == 200:
@@ -566,95 +748,274 @@ def get_readme(repo_name, headers):
                 readme_content = clean_markdown(readme_content)
             except Exception as e:
                 print(f"解码README内容出错: {str(e)}")
-    else:
-        print(f"获取README失败，状态码: {response.status_code}")
+    elif response.status_code != 404:
+        raise GithubRequestError(f"获取 {repo_name} 的README失败", response.status_code)
     
     return readme_content
 
-def get_contributors(repo_name, headers):
-    """获取仓库的贡献者信息"""
-    import requests
-    import time
+def _link_last_page(response):
+    """Link头中last链接的page参数即总页数，没有Link头说明只有一页"""
+    last_link = response.links.get("last", {}).get("url")
+    if last_link:
+        return int(parse_qs(urlparse(last_link).query).get("page", ["1"])[0])
+    return 1
+
+def _parse_contributors(page_contributors):
+    """将贡献者接口返回的一页数据转换为保存用的字段"""
+    return [
+        {
+            "login": contributor.get("login"),
+            "contributions": contributor.get("contributions"),
+            "url": contributor.get("html_url"),
+            "avatar_url": contributor.get("avatar_url")  # 添加头像URL
+        }
+        for contributor in page_contributors
+    ]
+
+def get_contributors(repo_name, headers, client=None, max_contributors=None, workers=4):
+    """
+    获取仓库的贡献者信息（接口按贡献次数从高到低返回）
+    
+    先获取第1页，从Link头的last链接得到总页数，再并发获取其余需要的页
     
+    参数:
+        max_contributors: 只获取贡献最多的前N位，None表示获取全部
+        workers: 并发获取其余页的线程数
+    
+    异常:
+        GithubRequestError: 任意一页获取失败
+    """
+    client = client or get_default_client()
     base_url = "https://api.github.com"
     contributors_url = f"{base_url}/repos/{repo_name}/contributors"
-    contributors = []
-    page = 1
-    per_page = 100
+    per_page = min(100, max_contributors) if max_contributors else 100
     
-    while True:
-        params = {
-            "page": page,
-            "per_page": per_page
-        }
-        response = requests.get(contributors_url, headers=headers, params=params)
-        
+    def fetch(page):
+        response = client.get(contributors_url, params={"page": page, "per_page": per_page}, headers=headers, conditional=True)
+        # 没有贡献者统计（如空仓库）时返回204，正文为空
+        if response.status_code == 204:
+            return [], response
         if response.status_code != 200:
-            print(f"获取贡献者信息失败，状态码: {response.status_code}")
-            break
-        
-        page_contributors = response.json()
-        if not page_contributors:
-            break
-            
-        for contributor in page_contributors:
-            contributors.append({
-                "login": contributor.get("login"),
-                "contributions": contributor.get("contributions"),
-                "url": contributor.get("html_url"),
-                "avatar_url": contributor.get("avatar_url")  # 添加头像URL
-            })
-        
-        page += 1
-        time.sleep(0.5)
-        
-        if len(page_contributors) < per_page:
-            break
+            raise GithubRequestError(f"获取 {repo_name} 第 {page} 页贡献者失败", response.status_code)
+        return (response.json() if response.content else []), response
+    
+    first_page, response = fetch(1)
+    if not first_page:
+        return []
+    contributors = _parse_contributors(first_page)
+    
+    last_page = _link_last_page(response)
+    if max_contributors:
+        last_page = min(last_page, math.ceil(max_contributors / per_page))
+    
+    if last_page > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 按页码顺序合并，保持贡献次数从高到低
+            for page_contributors, _ in executor.map(fetch, range(2, last_page + 1)):
+                if page_contributors:
+                    contributors.extend(_parse_contributors(page_contributors))
+    
+    return contributors[:max_contributors] if max_contributors else contributors
+
+def _count_star_dates(pages):
+    """按日期统计若干页stargazers的star数"""
+    star_history = {}
+    for stargazers in pages:
+        for star in stargazers:
+            starred_at = star.get("starred_at")
+            if starred_at:
+                date_str = starred_at.split('T')[0]
+                star_history[date_str] = star_history.get(date_str, 0) + 1
+    return star_history
+
+# stargazers接口最多只能翻到第400页（4万个star），之后的页返回422
+STARGAZER_PAGE_CAP = 400
+
+def _get_stargazer_page(stargazers_url, page, headers, client, per_page=100):
+    """
+    获取一页stargazers，第1页使用条件请求
     
-    return contributors
+    返回:
+        (stargazers列表, 响应)
+    
+    异常:
+        GithubRequestError: 状态码不是200
+    """
+    params = {"page": page, "per_page": per_page}
+    response = client.get(stargazers_url, params=params, headers=headers, conditional=(page == 1))
+    if response.status_code != 200:
+        raise GithubRequestError(f"获取star历史第 {page} 页失败", response.status_code)
+    return response.json(), response
 
-def get_star_history(repo_name, headers, max_pages=1000, silence=True):
-    """获取仓库的star历史"""
-    import requests
-    import time
-    import math
-    from datetime import datetime
+def _reachable_stargazer_pages(stargazers_url, estimated_pages, headers, client, per_page=100):
+    """
+    获取第1页，并确定实际能获取到的最后一页：
+    取第1页Link头中的last页、按总star数估算的页数和STARGAZER_PAGE_CAP中最小的一个
     
-    base_url = "https://api.github.com"
+    返回:
+        (第1页stargazers列表, 最后一页页码)
+    """
+    stargazers, response = _get_stargazer_page(stargazers_url, 1, headers, client, per_page)
+    return stargazers, max(min(estimated_pages, STARGAZER_PAGE_CAP, _link_last_page(response)), 1)
+
+def _fetch_stargazer_pages(stargazers_url, pages, headers, client, workers=4, per_page=100):
+    """
+    并发获取指定的stargazers页，速率由客户端的共享预算控制
     
-    # 先获取仓库的总star数
-    search_url = f"{base_url}/search/repositories"
+    返回:
+        {页码: stargazers列表}
+    
+    异常:
+        GithubRequestError: 任意一页获取失败
+    """
+    def fetch(page):
+        return page, _get_stargazer_page(stargazers_url, page, headers, client, per_page)[0]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(fetch, pages))
+
+def _spread_stars(star_history, start_date, end_date, count):
+    """
+    把count个star平均分配到 [start_date, end_date) 的每一天
+    
+    按累计值取整：第i天分到 floor((i+1)*count/days) - floor(i*count/days) 个，
+    star比天数少时也均匀分布在整个区间，而不是集中在开头几天
+    """
+    days = max((end_date - start_date).days, 1)
+    for i in range(days):
+        num = (i + 1) * count // days - i * count // days
+        if num:
+            date_str = (start_date + datetime.timedelta(days=i)).isoformat()
+            star_history[date_str] = star_history.get(date_str, 0) + num
+
+def _close_star_history(star_history, last_stargazers, counted, total_stars, per_page=100):
+    """
+    接口翻不到最后一页时补齐star历史：已统计的star比总star数少一页以上时，
+    把剩余的star平均分配到最后获取的一条star的日期到今天之间
+    
+    返回:
+        是否有无法获取的star（结果为近似值）
+    """
+    remaining = total_stars - counted
+    if remaining <= per_page:
+        return False
+    
+    starred_at = last_stargazers[-1].get("starred_at") if last_stargazers else None
+    if starred_at:
+        last_date = datetime.date.fromisoformat(starred_at.split('T')[0])
+        _spread_stars(star_history, last_date, datetime.date.today() + datetime.timedelta(days=1), remaining)
+    print(f"stargazers接口无法获取最后 {remaining} 个star，按日平均补齐到今天")
+    return True
+
+def _sampled_star_history(stargazers_url, first_page, last_page, total_stars, headers, client, workers=4, sample_pages=50, per_page=100):
+    """
+    抽样重建star历史
+    
+    每隔若干页获取一页，取该页第一条的starred_at作为累计曲线上的一个点：
+    第p页第一条之前共有 (p-1)*per_page 个star；相邻两点之间的star数平均分配到其间每一天，
+    最后一页逐条精确计数；最后一页之后接口无法访问的star由_close_star_history补齐到今天
+    
+    参数:
+        first_page: 已获取的第1页stargazers
+        last_page: 能获取到的最后一页页码
+    
+    返回:
+        (star历史字典, 是否有无法获取的star)
+    """
+    step = max(1, math.ceil(last_page / sample_pages))
+    pages = sorted((set(range(1, last_page + 1, step)) | {last_page}) - {1})
+    fetched = _fetch_stargazer_pages(stargazers_url, pages, headers, client, workers, per_page)
+    fetched[1] = first_page
+    
+    points = []
+    for page in sorted(fetched):
+        stargazers = fetched[page]
+        if stargazers and stargazers[0].get("starred_at"):
+            first_date = datetime.date.fromisoformat(stargazers[0]["starred_at"].split('T')[0])
+            points.append((first_date, (page - 1) * per_page))
+    
+    star_history = {}
+    for (start_date, start_count), (end_date, end_count) in zip(points, points[1:]):
+        _spread_stars(star_history, start_date, end_date, end_count - start_count)
+    
+    for date_str, num in _count_star_dates([fetched[last_page]]).items():
+        star_history[date_str] = star_history.get(date_str, 0) + num
+    
+    counted = (last_page - 1) * per_page + len(fetched[last_page])
+    return star_history, _close_star_history(star_history, fetched[last_page], counted, total_stars, per_page)
+
+def get_total_stars(repo_name, headers, client=None, silence=True):
+    """通过search接口获取仓库的总star数，失败时返回None"""
+    client = client or get_default_client()
+    search_url = "https://api.github.com/search/repositories"
     params = {
         "q": f"repo:{repo_name}",
         "per_page": 1
     }
     
     try:
-        response = requests.get(search_url, headers=headers, params=params)
+        response = client.get(search_url, params=params, headers=headers, resource="search")
         if response.status_code == 200:
             data = response.json()
             if "items" in data and len(data["items"]) > 0:
                 total_stars = data["items"][0].get("stargazers_count", 0)
                 if not silence:
                     print(f"仓库 {repo_name} 的总star数: {total_stars}")
-                
-                # 计算需要获取的页数 (每页100条，向上取整)
-                estimated_pages = math.ceil(total_stars / 100)
-                if not silence:
-                    print(f"预计需要获取 {estimated_pages} 页")
-                
-                # 如果预计页数超过最大页数限制，直接返回空结果
-                if estimated_pages > max_pages:
-                    print(f"预计需要获取 {estimated_pages} 页，超过最大限制 {max_pages} 页，跳过获取star历史")
-                    return {}, True
-            else:
-                print(f"未找到仓库 {repo_name} 的信息")
+                return total_stars
+            print(f"未找到仓库 {repo_name} 的信息")
         else:
             print(f"获取仓库信息失败，状态码: {response.status_code}")
             print(f"错误信息: {response.text}")
     except Exception as e:
         print(f"获取仓库star数出错: {str(e)}")
     
+    return None
+
+def get_star_history(repo_name, headers, max_pages=1000, silence=True, client=None, total_stars=None,
+                     mode="sequential", workers=4, sample_pages=50, parallel_max_pages=100):
+    """
+    获取仓库的star历史
+    
+    参数:
+        total_stars: 已知的总star数（如GraphQL批量获取的结果），为None时通过search接口查询
+        mode: 获取方式
+            sequential: 逐页获取，页数超过max_pages时跳过
+            parallel: 根据总star数和第1页的Link头算出页数后并发获取，页数超过parallel_max_pages时改为抽样
+            sampled: 只抽样获取约sample_pages页，重建近似的累计曲线
+            接口最多只能翻到STARGAZER_PAGE_CAP页，更多的star无法获取，parallel/sampled模式
+            把剩余的star平均分配到最后获取的日期到今天之间，并返回超过获取上限
+        workers: parallel/sampled模式下的并发线程数
+        sample_pages: sampled模式下抽样的页数
+        parallel_max_pages: parallel模式下全量获取的页数上限（不超过max_pages）
+    
+    返回:
+        (star历史字典, 是否超过获取上限)
+    
+    异常:
+        GithubRequestError: 任意一页获取失败
+    """
+    import time
+    import math
+    from datetime import datetime
+    
+    client = client or get_default_client()
+    base_url = "https://api.github.com"
+    
+    # 先获取仓库的总star数
+    if total_stars is None:
+        total_stars = get_total_stars(repo_name, headers, client=client, silence=silence)
+    
+    if total_stars is not None and mode == "sequential":
+        # 计算需要获取的页数 (每页100条，向上取整)
+        estimated_pages = math.ceil(total_stars / 100)
+        if not silence:
+            print(f"预计需要获取 {estimated_pages} 页")
+        
+        # 如果预计页数超过最大页数限制，直接返回空结果
+        if estimated_pages > max_pages:
+            print(f"预计需要获取 {estimated_pages} 页，超过最大限制 {max_pages} 页，跳过获取star历史")
+            return {}, True
+    
     # 继续原有的获取star历史的逻辑
     stargazers_url = f"{base_url}/repos/{repo_name}/stargazers"
     
@@ -670,17 +1031,40 @@ def get_star_history(repo_name, headers, max_pages=1000, silence=True):
     if not silence:
         print(f"开始获取 {repo_name} 的star历史...")
     
+    # 已知总star数时可直接规划页码，并发或抽样获取
+    if mode != "sequential" and total_stars is not None:
+        estimated_pages = math.ceil(total_stars / per_page)
+        if estimated_pages == 0:
+            return star_history, exceeded_limit
+        
+        first_page, last_page = _reachable_stargazer_pages(stargazers_url, estimated_pages,
+                                                           headers_with_timestamp, client, per_page)
+        
+        if mode == "parallel" and last_page <= min(parallel_max_pages, max_pages):
+            fetched = _fetch_stargazer_pages(stargazers_url, range(2, last_page + 1),
+                                             headers_with_timestamp, client, workers, per_page)
+            fetched[1] = first_page
+            star_history = _count_star_dates(fetched[p] for p in sorted(fetched))
+            counted = sum(len(stargazers) for stargazers in fetched.values())
+            exceeded_limit = _close_star_history(star_history, fetched[last_page], counted, total_stars, per_page)
+            return star_history, exceeded_limit
+        
+        if not silence:
+            print(f"可获取 {last_page} 页，抽样获取约 {sample_pages} 页")
+        return _sampled_star_history(stargazers_url, first_page, last_page, total_stars, headers_with_timestamp,
+                                     client, workers, sample_pages, per_page)
+    
     while True:
         params = {
             "page": page,
             "per_page": per_page
         }
-        response = requests.get(stargazers_url, headers=headers_with_timestamp, params=params)
+        # 第1页使用条件请求，未变化时不消耗速率额度
+        response = client.get(stargazers_url, params=params, headers=headers_with_timestamp, conditional=(page == 1))
         
         if response.status_code != 200:
-            print(f"获取star历史失败，状态码: {response.status_code}")
             print(f"错误信息: {response.text}")
-            break
+            raise GithubRequestError(f"获取star历史第 {page} 页失败", response.status_code)
         
         stargazers = response.json()
         if not stargazers:
@@ -707,6 +1091,11 @@ def get_star_history(repo_name, headers, max_pages=1000, silence=True):
         if len(stargazers) < per_page:
             break
         
+        if page > STARGAZER_PAGE_CAP:
+            print(f"stargazers接口最多只能获取 {STARGAZER_PAGE_CAP} 页，停止获取更多star记录")
+            exceeded_limit = True
+            break
+        
         if page > max_pages:
             print(f"达到获取上限({max_pages}页)，停止获取更多star记录")
             exceeded_limit = True
@@ -714,84 +1103,359 @@ def get_star_history(repo_name, headers, max_pages=1000, silence=True):
     
     return star_history, exceeded_limit
 
-def create_embedding(text, SETTINGS=DEFAULT_SETTINGS):
-    """使用Qwen模型创建文本嵌入"""
+def get_star_history_tail(repo_name, headers, star_history, max_pages=1000, silence=True, client=None, total_stars=None,
+                          **history_options):
+    """
+    增量更新star历史
     
-    client = OpenAI(
-        api_key=SETTINGS.get('qwen_api_key'),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-    )
+    stargazers按star时间从旧到新返回，因此从最后一页开始向前获取，
+    直到某页的第一条早于已有记录的最后日期为止；最后日期当天可能只统计了一部分，
+    所以丢弃已有记录中该日期的计数，用新获取的数据重新统计该日期及之后的star
     
-    # 截取文本以适应API限制
-    text = text[:8000] if text else ""
+    最后一页由第1页的Link头确定；star数超过接口能翻到的页数（STARGAZER_PAGE_CAP）时新的star无法获取，
+    把新增的star平均分配到已有记录的最后日期之后到今天，并返回超过获取上限
     
-    try:
-        completion = client.embeddings.create(
-            model="text-embedding-v3",
-            input=text,
-            dimensions=1024,
-            encoding_format="float"
-        )
-        return completion.data[0].embedding
-    except Exception as e:
-        print(f"创建嵌入向量失败: {str(e)}")
-        # 返回一个全零向量作为fallback
-        return [0.0] * 1024
-
-def save_contributors_to_db(contributors, repo_name, repo_url, conn, silence=True):
-    """将贡献者信息保存到MySQL数据库"""
-    cursor = conn.cursor()
+    参数:
+        star_history: 已有的star历史字典
+        total_stars: 已知的总star数，为None时通过search接口查询
+        history_options: 已有记录为空时传给get_star_history的参数（mode、workers、sample_pages、parallel_max_pages）
     
-    try:
-        # 保存贡献者基本信息
-        for contributor in contributors:
-            # 插入或更新贡献者信息
-            insert_contributor_query = """
-            INSERT INTO contributors (url, login, avatar_url)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-                login = VALUES(login),
-                avatar_url = VALUES(avatar_url)
-            """
-            cursor.execute(insert_contributor_query, (
-                contributor.get("url", ""),
-                contributor.get("login", ""),
-                contributor.get("avatar_url", "")
-            ))
-            
-            # 插入或更新贡献者与仓库的关系
-            insert_relation_query = """
-            INSERT INTO repo_contributors (contributor_url, repo_url, contributions)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE contributions = VALUES(contributions)
-            """
-            cursor.execute(insert_relation_query, (
-                contributor.get("url", ""),
-                repo_url,
-                contributor.get("contributions", 0)
-            ))
-        
-        conn.commit()
-        if not silence:
-            print(f"已保存 {len(contributors)} 位贡献者信息到数据库")
-    except Exception as e:
-        conn.rollback()
-        print(f"保存贡献者信息失败: {str(e)}")
-    finally:
-        cursor.close()
-
-def save_to_qdrant(repo_name, readme_content, star_history, qdrant_client, collection_name, SETTINGS):
-    """将数据保存到Qdrant"""
-    import uuid
-    from datetime import datetime
+    返回:
+        (合并后的star历史字典, 是否超过获取上限)
     
-    # 基于仓库名生成确定性UUID (UUID v5)
-    # 使用UUID命名空间和仓库名作为名称，确保同一仓库始终生成相同的UUID
-    namespace = uuid.NAMESPACE_URL  # 使用URL命名空间
-    qdrant_id = str(uuid.uuid5(namespace, f"github.com/{repo_name}"))
+    异常:
+        GithubRequestError: 获取总star数失败或任意一页获取失败
+    """
+    if not star_history:
+        return get_star_history(repo_name, headers, max_pages, silence, client=client, total_stars=total_stars,
+                                **history_options)
+    
+    client = client or get_default_client()
+    if total_stars is None:
+        total_stars = get_total_stars(repo_name, headers, client=client, silence=silence)
+    if total_stars is None:
+        # 不知道总star数就无法确定最后一页；不退回全量获取，由调用方保留已有记录
+        raise GithubRequestError(f"获取 {repo_name} 的总star数失败，无法增量获取star历史")
+    
+    stargazers_url = f"https://api.github.com/repos/{repo_name}/stargazers"
+    headers_with_timestamp = headers.copy()
+    headers_with_timestamp['Accept'] = 'application/vnd.github.v3.star+json'
+    per_page = 100
+    
+    last_date = max(star_history)
+    estimated_pages = max(math.ceil(total_stars / per_page), 1)
+    first_page, page = _reachable_stargazer_pages(stargazers_url, estimated_pages, headers_with_timestamp, client, per_page)
+    
+    # 最新的star在接口能访问的页之后，只能按总star数的增长近似补齐
+    if total_stars - page * per_page > per_page:
+        merged = dict(star_history)
+        growth = total_stars - sum(star_history.values())
+        if growth > 0:
+            today = datetime.date.today()
+            start_date = min(datetime.date.fromisoformat(last_date) + datetime.timedelta(days=1), today)
+            _spread_stars(merged, start_date, today + datetime.timedelta(days=1), growth)
+        print(f"{repo_name} 的star数超过stargazers接口的 {STARGAZER_PAGE_CAP} 页上限，新增的 {max(growth, 0)} 个star按日平均补齐")
+        return merged, True
+    
+    fetched_pages = []
+    while page >= 1:
+        if page == 1:
+            stargazers = first_page
+        else:
+            stargazers = _get_stargazer_page(stargazers_url, page, headers_with_timestamp, client, per_page)[0]
+        fetched_pages.append(stargazers)
+        
+        first_starred_at = stargazers[0].get("starred_at", "") if stargazers else ""
+        if first_starred_at and first_starred_at.split('T')[0] < last_date:
+            break
+        
+        if len(fetched_pages) >= max_pages:
+            print(f"达到获取上限({max_pages}页)，停止增量获取star记录")
+            return star_history, True
+        page -= 1
+    
+    new_counts = _count_star_dates(fetched_pages)
+    merged = {date_str: num for date_str, num in star_history.items() if date_str < last_date}
+    for date_str, num in new_counts.items():
+        if date_str >= last_date:
+            merged[date_str] = num
+    
+    if not silence:
+        print(f"{repo_name} 增量获取了 {len(fetched_pages)} 页star记录")
+    
+    return merged, False
+
+def create_embeddings(texts, SETTINGS=DEFAULT_SETTINGS):
+    """
+    使用配置的嵌入后端（SETTINGS['embedding_backend']）批量创建文本嵌入
+    
+    返回:
+        与texts顺序一致的嵌入向量列表，空文本对应全零向量
+        
+    异常:
+        EmbeddingError: 嵌入失败时抛出，不会写入全零向量
+    """
+    return get_embedding_backend(SETTINGS).embed(texts)
+
+def create_embedding(text, SETTINGS=DEFAULT_SETTINGS):
+    """为单条文本创建嵌入"""
+    return create_embeddings([text], SETTINGS)[0]
+
+def embedding_model_key(SETTINGS=DEFAULT_SETTINGS):
+    """嵌入后端的模型和维度标识，模型或维度变化后缓存自然失效"""
+    return get_embedding_backend(SETTINGS).model_key
+
+def readme_hash(text):
+    """清理后README文本的SHA-256"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def load_cached_embeddings(conn, hashes, SETTINGS=DEFAULT_SETTINGS):
+    """按内容哈希批量读取已缓存的嵌入向量，返回 {哈希: 向量}"""
+    hashes = list(hashes)
+    if not hashes:
+        return {}
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT content_hash, embedding
+            FROM embedding_cache
+            WHERE model_key = %s AND content_hash IN ({', '.join(['%s'] * len(hashes))})
+        """, [embedding_model_key(SETTINGS)] + hashes)
+        return {row[0]: array.array('f', row[1]).tolist() for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def store_embeddings(conn, embeddings, SETTINGS=DEFAULT_SETTINGS):
+    """批量写入 {哈希: 向量} 到嵌入缓存表"""
+    if not embeddings:
+        return
+    
+    model_key = embedding_model_key(SETTINGS)
+    cursor = conn.cursor()
+    try:
+        bulk_upsert(
+            cursor,
+            "embedding_cache",
+            ["content_hash", "model_key", "embedding"],
+            [(content_hash, model_key, array.array('f', vector).tobytes()) for content_hash, vector in embeddings.items()],
+            "embedding = VALUES(embedding)"
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"保存嵌入缓存失败: {str(e)}")
+    finally:
+        cursor.close()
+
+def embed_with_cache(conn, wanted, SETTINGS=DEFAULT_SETTINGS):
+    """
+    通过嵌入缓存获取文本的向量：先按内容哈希查询缓存，只为未命中的文本调用嵌入接口，新向量写回缓存
+    
+    参数:
+        wanted: {内容哈希: 文本}
+        
+    返回:
+        {内容哈希: 向量}，空文本（全零向量）既不缓存也不包含在结果中
+    """
+    vectors = load_cached_embeddings(conn, wanted.keys(), SETTINGS)
+    misses = [content_hash for content_hash in wanted if content_hash not in vectors]
+    
+    if misses:
+        new_embeddings = {}
+        for content_hash, vector in zip(misses, create_embeddings([wanted[h] for h in misses], SETTINGS)):
+            if wanted[content_hash] and any(vector):
+                new_embeddings[content_hash] = vector
+        store_embeddings(conn, new_embeddings, SETTINGS)
+        vectors.update(new_embeddings)
+    return vectors
+
+def _reembed_points(qdrant_client, collection_name, text_field, conn, SETTINGS, scroll_size=100, record_model=False):
+    """
+    逐批滚动集合中的点，按payload中text_field的文本重新生成向量
+    
+    record_model为True时同时在payload中记录新的embedding_model和文本的readme_hash
+    
+    返回:
+        处理的点数
+    """
+    model_key = embedding_model_key(SETTINGS)
+    payload_fields = [text_field, "readme_hash"] if record_model else [text_field]
+    
+    updated = 0
+    offset = None
+    with tqdm(desc=f"重新生成 {collection_name} 的嵌入") as pbar:
+        while True:
+            points, offset = qdrant_client.scroll(
+                collection_name=collection_name,
+                limit=scroll_size,
+                offset=offset,
+                with_payload=payload_fields,
+                with_vectors=False
+            )
+            if not points:
+                break
+            
+            texts = {point.id: (point.payload or {}).get(text_field) or "" for point in points}
+            hashes = {point_id: readme_hash(text) for point_id, text in texts.items()}
+            vectors = embed_with_cache(conn, {hashes[point_id]: text for point_id, text in texts.items()}, SETTINGS)
+            
+            # 空文本的点保留原有的全零向量
+            point_vectors = [models.PointVectors(id=point_id, vector=vectors[content_hash])
+                             for point_id, content_hash in hashes.items() if content_hash in vectors]
+            if point_vectors:
+                qdrant_client.update_vectors(collection_name=collection_name, points=point_vectors)
+            
+            if record_model:
+                qdrant_client.set_payload(collection_name=collection_name, payload={"embedding_model": model_key},
+                                          points=list(texts))
+                for point in points:
+                    if (point.payload or {}).get("readme_hash") != hashes[point.id]:
+                        qdrant_client.set_payload(collection_name=collection_name,
+                                                  payload={"readme_hash": hashes[point.id]}, points=[point.id])
+            
+            updated += len(points)
+            pbar.update(len(points))
+            
+            if offset is None:
+                break
+    
+    return updated
+
+def reembed_collection(SETTINGS=DEFAULT_SETTINGS, collection_name="github_repos", scroll_size=100):
+    """
+    切换嵌入模型后批量重新生成向量：片段集合中每个README片段的向量，以及集合中每个仓库的README向量
+    
+    文本按内容哈希经过嵌入缓存，缓存中已有的不再调用嵌入接口；
+    仓库点的payload同时更新embedding_model和readme_hash，之后的详情刷新据此判断向量无需重新生成，
+    其他payload字段不变。先处理片段再处理仓库，中途失败时仓库点仍记录旧模型，详情刷新会重新生成片段
+    
+    返回:
+        {"repos": 处理的仓库点数, "chunks": 处理的片段点数}
+    """
+    qdrant_client = QdrantClient(
+        url=SETTINGS.get('qdrant_url', 'http://localhost:6333')
+    )
+    conn = conn_init(SETTINGS)
+    
+    try:
+        chunk_collection = SETTINGS.get('chunk_collection', 'github_repo_chunks')
+        chunks = 0
+        try:
+            qdrant_client.get_collection(chunk_collection)
+        except Exception:
+            print(f"片段集合 {chunk_collection} 不存在，只处理仓库向量")
+        else:
+            chunks = _reembed_points(qdrant_client, chunk_collection, "text", conn, SETTINGS, scroll_size)
+        
+        repos = _reembed_points(qdrant_client, collection_name, "readme_content", conn, SETTINGS, scroll_size,
+                                record_model=True)
+    finally:
+        conn.close()
+        qdrant_client.close()
+    
+    return {"repos": repos, "chunks": chunks}
+
+def save_contributors_to_db(contributors, repo_name, repo_url, conn, silence=True):
+    """
+    将贡献者信息批量保存到MySQL数据库，每个仓库两条多行语句，并增量更新贡献者排行
+    
+    保存失败时回滚并抛出异常
+    """
+    cursor = conn.cursor()
+    
+    try:
+        # 插入或更新贡献者信息
+        bulk_upsert(
+            cursor,
+            "contributors",
+            ["url", "login", "avatar_url"],
+            [(c.get("url", ""), c.get("login", ""), c.get("avatar_url", "")) for c in contributors],
+            "login = VALUES(login), avatar_url = VALUES(avatar_url)"
+        )
+        
+        # 关联表使用整数id，按url换算
+        contributor_ids = existing_values(cursor, "contributors", "url", "id", [c.get("url", "") for c in contributors])
+        repo_id = existing_values(cursor, "repositories", "url", "id", [repo_url]).get(repo_url.lower())
+        if repo_id is None:
+            raise ValueError(f"repositories中没有仓库 {repo_url}")
+        
+        # 插入或更新贡献者与仓库的关系
+        rows = [(repo_id, contributor_ids[c.get("url", "").lower()], c.get("contributions", 0))
+                for c in contributors if c.get("url", "").lower() in contributor_ids]
+        bulk_upsert(
+            cursor,
+            "repo_contributors",
+            ["repo_id", "contributor_id", "contributions"],
+            rows,
+            "contributions = VALUES(contributions)"
+        )
+        
+        # 删除不在本次列表中的关系（设置max_contributors时为前N位以外的贡献者），
+        # 该仓库的star只在保存的贡献者之间分配
+        saved_ids = {row[1] for row in rows}
+        cursor.execute("SELECT contributor_id FROM repo_contributors WHERE repo_id = %s", (repo_id,))
+        removed_ids = [row[0] for row in cursor.fetchall() if row[0] not in saved_ids]
+        for i in range(0, len(removed_ids), 500):
+            batch = removed_ids[i:i + 500]
+            cursor.execute(
+                f"DELETE FROM repo_contributors WHERE repo_id = %s AND contributor_id IN ({', '.join(['%s'] * len(batch))})",
+                [repo_id] + batch
+            )
+        
+        # 贡献次数变化后重新分配该仓库的star，并更新这些贡献者和被移除的贡献者的排行
+        update_repo_contributor_scores(cursor, [repo_id])
+        refresh_contributor_totals(cursor, removed_ids)
+        
+        conn.commit()
+        if not silence:
+            print(f"已保存 {len(contributors)} 位贡献者信息到数据库")
+    except Exception as e:
+        # 回滚后抛出，由调用方决定如何处理（不能把这次的pushed_at记为已处理）
+        conn.rollback()
+        print(f"保存贡献者信息失败: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+def qdrant_point_id(repo_name):
+    """
+    基于仓库名生成确定性UUID (UUID v5)
+    使用URL命名空间和仓库名作为名称，确保同一仓库始终生成相同的UUID
+    """
+    import uuid
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"github.com/{repo_name}"))
+
+def save_to_qdrant(repo_name, readme_content, star_history, qdrant_client, collection_name, SETTINGS, embedding=None,
+                   vector_unchanged=False, chunk_count=None, metadata=None):
+    """
+    将数据保存到Qdrant，embedding为None时为README创建嵌入向量
+    
+    vector_unchanged为True表示README和嵌入模型都没有变化，Qdrant中的向量仍然有效，
+    此时只更新star历史和更新时间，不重新上传向量和README；
+    chunk_count为写入片段集合的README片段数；
+    metadata为本次获取详情时仓库的pushed_at和stars，记录在payload中供下次变化检测使用
+    """
+    from datetime import datetime
+    
+    qdrant_id = qdrant_point_id(repo_name)
+    
+    last_updated = datetime.now().isoformat()
+    if vector_unchanged:
+        qdrant_client.set_payload(
+            collection_name=collection_name,
+            payload={
+                "star_history": star_history,
+                "last_updated": last_updated,
+                **(metadata or {})
+            },
+            points=[qdrant_id]
+        )
+        return qdrant_id
     
     # 创建README的嵌入向量
-    embedding = create_embedding(readme_content, SETTINGS)
+    if embedding is None:
+        embedding = create_embedding(readme_content, SETTINGS)
     
     # 存储到Qdrant
     qdrant_client.upsert(
@@ -804,7 +1468,11 @@ def save_to_qdrant(repo_name, readme_content, star_history, qdrant_client, colle
                     "repo_name": repo_name,
                     "readme_content": readme_content,
                     "star_history": star_history,
-                    "last_updated": datetime.now().isoformat()
+                    "readme_hash": readme_hash(readme_content),
+                    "embedding_model": embedding_model_key(SETTINGS),
+                    "chunk_count": chunk_count,
+                    "last_updated": last_updated,
+                    **(metadata or {})
                 }
             )
         ]
@@ -812,6 +1480,68 @@ def save_to_qdrant(repo_name, readme_content, star_history, qdrant_client, colle
     
     return qdrant_id        
 
+def chunk_text(text, chunk_size=1000, overlap=200, max_chunks=50):
+    """
+    将清理后的README切分为相互重叠的片段
+    
+    每个片段不超过chunk_size个字符，尽量在句末（。！？.!?）处切开，
+    相邻片段重叠overlap个字符，避免一句话被切断后两边都检索不到
+    """
+    if not text:
+        return []
+    
+    chunks = []
+    start = 0
+    while start < len(text) and len(chunks) < max_chunks:
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # 在片段后半部分寻找最后一个句末标点
+            boundary = max(text.rfind(mark, start + chunk_size // 2, end) for mark in "。！？.!?")
+            if boundary != -1:
+                end = boundary + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    
+    return [chunk for chunk in chunks if chunk]
+
+def _chunk_point_id(repo_name, index):
+    """README片段的确定性UUID"""
+    import uuid
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"github.com/{repo_name}#chunk-{index}"))
+
+def save_readme_chunks(repo_name, chunk_vectors, qdrant_client, SETTINGS):
+    """
+    将README片段保存到片段集合，每个片段一个点，payload中记录repo_name
+    先删除该仓库的旧片段，README变短时不会残留多余的片段
+    
+    返回:
+        写入的片段数
+    """
+    collection_name = SETTINGS.get('chunk_collection', 'github_repo_chunks')
+    repo_filter = models.Filter(must=[
+        models.FieldCondition(key="repo_name", match=models.MatchValue(value=repo_name))
+    ])
+    qdrant_client.delete(collection_name=collection_name, points_selector=models.FilterSelector(filter=repo_filter))
+    
+    points = [
+        models.PointStruct(
+            id=_chunk_point_id(repo_name, index),
+            vector=vector,
+            payload={
+                "repo_name": repo_name,
+                "chunk_index": index,
+                "text": chunk
+            }
+        )
+        for index, (chunk, vector) in enumerate(chunk_vectors)
+        if vector is not None
+    ]
+    if points:
+        qdrant_client.upsert(collection_name=collection_name, points=points)
+    return len(points)
+
 def update_mysql_mapping(repo_name, qdrant_id, conn, silence=True):
     """更新MySQL中的仓库-Qdrant ID映射"""
     cursor = conn.cursor()
@@ -835,76 +1565,149 @@ def update_mysql_mapping(repo_name, qdrant_id, conn, silence=True):
     finally:
         cursor.close()
 
-def get_cached_data(repo_name, qdrant_client, collection_name, conn, ):
-    """从缓存中获取数据"""
-    cursor = conn.cursor(dictionary=True)
+# 判断新鲜度只需要的payload字段
+FRESHNESS_FIELDS = ["repo_name", "last_updated", "readme_hash", "embedding_model", "chunk_count", "pushed_at", "stars"]
+
+def _isoformat(value):
+    """把MySQL返回的日期时间统一为ISO格式字符串，便于与payload中记录的值比较"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+def detect_changes(payload, metadata):
+    """
+    比较仓库当前的元数据和上次获取详情时记录在payload中的值
     
-    try:
-        # 检查MySQL中是否已有该仓库的Qdrant ID映射
-        query = "SELECT qdrant_id, last_updated FROM repo_qdrant_mapping WHERE repo_name = %s"
-        cursor.execute(query, (repo_name,))
-        mapping = cursor.fetchone()
-        
-        if mapping:
-            qdrant_id = mapping['qdrant_id']
-            last_updated = mapping['last_updated']
-            
-            # 如果上次更新时间在1天内，使用缓存数据
-            if (datetime.datetime.now() - last_updated).days <= 1:
-                print(f"{repo_name}使用缓存的数据，上次更新时间: {last_updated}")
-                
-                # 从Qdrant获取数据
-                points = qdrant_client.retrieve(
-                    collection_name=collection_name,
-                    ids=[qdrant_id]
-                )
-                
-                if points:
-                    return {
-                        "qdrant_id": qdrant_id,
-                        "payload": points[0].payload,
-                        "is_fresh": True
-                    }
+    参数:
+        payload: Qdrant中的payload，包含上次记录的pushed_at和stars
+        metadata: repositories表中当前的pushed_at和stars
         
-        return {"is_fresh": False}
-    finally:
-        cursor.close()
+    返回:
+        (readme_changed, stars_changed)，任一侧没有记录时视为已变化
+    """
+    recorded_pushed_at = payload.get("pushed_at")
+    current_pushed_at = _isoformat(metadata.get("pushed_at"))
+    readme_changed = recorded_pushed_at is None or current_pushed_at is None or recorded_pushed_at != current_pushed_at
+    
+    recorded_stars = payload.get("stars")
+    current_stars = metadata.get("stars")
+    stars_changed = recorded_stars is None or current_stars is None or recorded_stars != current_stars
+    
+    return readme_changed, stars_changed
 
-def get_repo_details(repo_name,repo_url, SETTINGS=DEFAULT_SETTINGS, renew_markdown=True, renew = False):
+def load_cached_payloads(repo_names, qdrant_client, collection_name, payload_fields=None, max_age_days=1, batch_size=1000):
     """
-    获取指定仓库的详细信息，包括贡献者、star增长记录、README文件内容
-    将star历史和README内容存储到Qdrant中，并在MySQL中建立映射关系
+    按本地计算的点ID批量读取仓库在Qdrant中的payload，不需要查询repo_qdrant_mapping
     
     参数:
-        repo_name: 仓库全名，格式为 "owner/repo"
-        SETTINGS: 配置字典，包含GitHub API的认证信息等
-        renew_markdown: 是否重新获取README内容，默认为True
+        repo_names: 仓库全名列表
+        payload_fields: 读取的payload字段，None表示全部字段
+        max_age_days: last_updated在该天数之内视为新鲜
+        batch_size: 每次retrieve包含的点数
         
     返回:
-        包含仓库详细信息的字典
+        {仓库全名: {"qdrant_id", "payload", "is_fresh"}}，Qdrant中没有的仓库不包含在结果中
     """
-    # 初始化结果字典
-    result = {
-        "name": repo_name,
-        "contributors": [],
-        "star_history": {},
-        "readme_content": "",
-    }
+    ids = {qdrant_point_id(repo_name): repo_name for repo_name in repo_names}
+    id_list = list(ids)
+    now = datetime.datetime.now()
+    
+    cached = {}
+    for start in range(0, len(id_list), batch_size):
+        points = qdrant_client.retrieve(
+            collection_name=collection_name,
+            ids=id_list[start:start + batch_size],
+            with_payload=payload_fields if payload_fields is not None else True,
+            with_vectors=False
+        )
+        for point in points:
+            payload = point.payload or {}
+            last_updated = payload.get("last_updated")
+            is_fresh = False
+            if last_updated:
+                is_fresh = (now - datetime.datetime.fromisoformat(last_updated)).days <= max_age_days
+            cached[ids[str(point.id)]] = {
+                "qdrant_id": str(point.id),
+                "payload": payload,
+                "is_fresh": is_fresh
+            }
+    return cached
 
+def _stars_reused(cached_entry):
+    """是否沿用缓存的star历史：有变化检测结果时以star数是否变化为准，否则看缓存是否新鲜"""
+    if "stars_unchanged" in cached_entry:
+        return cached_entry["stars_unchanged"]
+    return cached_entry.get("is_fresh", False)
+
+def plan_detail_refresh(repo_names, qdrant_client, collection_name, renew_markdown=True, renew=False, max_age_days=1,
+                        metadata=None, silence=True):
+    """
+    在开始任何网络请求之前，为整批仓库判断缓存是否新鲜、仓库是否有变化
     
-    # 超过API限制的项目列表
-    exceeded_limit_repos = []
+    第一次查询只读取所有仓库的last_updated等轻量字段；
+    之后只为需要处理且已有数据的仓库读取star历史，沿用缓存README的仓库同时读取README正文
     
-    # 连接MySQL
-    conn = conn_init(SETTINGS)
+    参数:
+        metadata: {仓库全名: {"pushed_at", "stars"}}，提供时启用变化检测：
+                  pushed_at未变化的仓库不重新获取README和贡献者，star数未变化的仓库不重新获取star历史
+        
+    返回:
+        (cached, skipped)
+        cached: {仓库全名: 与get_cached_data返回值结构相同的字典，另有readme_unchanged和stars_unchanged标记}，
+                供_new_detail_task使用
+        skipped: 无需任何处理的仓库列表（缓存新鲜且不更新README，或README和star数都没有变化）
+    """
+    cached = load_cached_payloads(repo_names, qdrant_client, collection_name, FRESHNESS_FIELDS, max_age_days)
     
-    # 连接Qdrant
-    qdrant_client = QdrantClient(
-        url=SETTINGS.get('qdrant_url', 'http://localhost:6333')
-    )
+    skipped = []
+    for repo_name in repo_names:
+        entry = cached.get(repo_name)
+        if entry is None or renew:
+            continue
+        
+        if metadata and repo_name in metadata:
+            readme_changed, stars_changed = detect_changes(entry["payload"], metadata[repo_name])
+            entry["readme_unchanged"] = not readme_changed
+            entry["stars_unchanged"] = not stars_changed
+        
+        readme_reused = entry.get("readme_unchanged") or not renew_markdown
+        stars_reused = _stars_reused(entry)
+        if readme_reused and stars_reused:
+            skipped.append(repo_name)
+    skipped_set = set(skipped)
+    
+    # 沿用缓存README的仓库需要README正文，其余仓库只需要star历史
+    pending = [repo_name for repo_name in repo_names if repo_name in cached and repo_name not in skipped_set]
+    with_readme = [repo_name for repo_name in pending
+                   if not renew_markdown or (not renew and cached[repo_name].get("readme_unchanged"))]
+    with_readme_set = set(with_readme)
+    for names, fields in ((with_readme, ["star_history", "readme_content"]),
+                          ([repo_name for repo_name in pending if repo_name not in with_readme_set], ["star_history"])):
+        for repo_name, entry in load_cached_payloads(names, qdrant_client, collection_name, fields, max_age_days).items():
+            cached[repo_name]["payload"].update(entry["payload"])
+    
+    if not silence:
+        fresh = sum(1 for entry in cached.values() if entry["is_fresh"])
+        unchanged = sum(1 for entry in cached.values() if entry.get("readme_unchanged") and entry.get("stars_unchanged"))
+        print(f"共 {len(repo_names)} 个仓库，{len(cached)} 个已有缓存，其中 {fresh} 个新鲜、{unchanged} 个没有变化，"
+              f"跳过 {len(skipped)} 个")
     
-    # 确保集合存在
-    collection_name = "github_repos"
+    planned = {repo_name: cached.get(repo_name, {"is_fresh": False}) for repo_name in repo_names if repo_name not in skipped_set}
+    return planned, skipped
+
+def get_cached_data(repo_name, qdrant_client, collection_name, max_age_days=1):
+    """
+    从缓存中获取单个仓库的数据
+    
+    缓存过期时同样返回payload（is_fresh为False），供增量更新star历史使用
+    """
+    cached = load_cached_payloads([repo_name], qdrant_client, collection_name, max_age_days=max_age_days)
+    return cached.get(repo_name, {"is_fresh": False})
+
+def _ensure_collection(qdrant_client, collection_name, dimensions=1024, index_repo_name=False):
+    """确保Qdrant集合存在，index_repo_name为True时为repo_name建立payload索引（用于按仓库分组和删除）"""
     try:
         qdrant_client.get_collection(collection_name)
     except Exception:
@@ -912,68 +1715,602 @@ def get_repo_details(repo_name,repo_url, SETTINGS=DEFAULT_SETTINGS, renew_markdo
         qdrant_client.create_collection(
             collection_name=collection_name,
             vectors_config=models.VectorParams(
-                size=1024,  # 使用Qwen模型的嵌入维度
+                size=dimensions,  # 与嵌入后端的向量维度一致
                 distance=models.Distance.COSINE
             )
         )
+        if index_repo_name:
+            qdrant_client.create_payload_index(
+                collection_name=collection_name,
+                field_name="repo_name",
+                field_schema=models.PayloadSchemaType.KEYWORD
+            )
+
+class DetailsSession:
+    """
+    仓库详情获取的会话，整批仓库共用：
+    一个Qdrant客户端（集合只检查一次）、一个GitHub客户端，以及按线程复用的MySQL连接
     
-    # 检查缓存
-    cached_data = get_cached_data(repo_name, qdrant_client, collection_name, conn)
+    MySQL连接不能跨线程共享，get_conn在每个线程第一次调用时建立连接，会话关闭时统一关闭
     
-    need_update_stars = True
-    need_update_readme = renew_markdown
-    qdrant_id = cached_data.get("qdrant_id")
+    用法:
+        with DetailsSession(SETTINGS) as session:
+            for repo in repos:
+                get_repo_details(repo['name'], repo['url'], SETTINGS, session=session)
+    """
     
-    # 如果有缓存且缓存是新鲜的
-    if cached_data.get("is_fresh", False) and renew== False:
-        payload = cached_data.get("payload", {})
-        result["star_history"] = payload.get("star_history", {})
+    def __init__(self, SETTINGS=DEFAULT_SETTINGS, client=None, collection_name="github_repos"):
+        self.SETTINGS = SETTINGS
+        self.client = client or get_default_client(SETTINGS)
+        self.collection_name = collection_name
+        self.chunk_collection = SETTINGS.get('chunk_collection', 'github_repo_chunks')
         
-        # 如果不需要更新README，则使用缓存的README内容
-        if not need_update_readme:
-            result["readme_content"] = payload.get("readme_content", "")
-            
-        need_update_stars = False
+        self.qdrant_client = QdrantClient(
+            url=SETTINGS.get('qdrant_url', 'http://localhost:6333')
+        )
+        
+        # 确保集合存在
+        dimensions = get_embedding_backend(SETTINGS).dimensions
+        _ensure_collection(self.qdrant_client, self.collection_name, dimensions)
+        _ensure_collection(self.qdrant_client, self.chunk_collection, dimensions, index_repo_name=True)
+        
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+    
+    def get_conn(self):
+        """当前线程的MySQL连接，首次调用时建立"""
+        if not hasattr(self._local, "conn"):
+            self._local.conn = conn_init(self.SETTINGS)
+            with self._connections_lock:
+                self._connections.append(self._local.conn)
+        return self._local.conn
+    
+    @property
+    def env(self):
+        """各阶段函数使用的环境字典"""
+        return {
+            "SETTINGS": self.SETTINGS,
+            "client": self.client,
+            "qdrant_client": self.qdrant_client,
+            "collection_name": self.collection_name,
+            "get_conn": self.get_conn
+        }
+    
+    def close(self):
+        """关闭所有线程的MySQL连接和Qdrant客户端"""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+        self.qdrant_client.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _new_detail_task(repo_name, repo_url, renew_markdown=True, renew=False, prefetched=None, cached=None, metadata=None):
+    """
+    创建一个仓库详情任务，各阶段函数依次填充其中的字段
     
-    # 获取README内容
-    if need_update_readme:
-        result["readme_content"] = get_readme(repo_name, SETTINGS['headers'])
+    cached为plan_detail_refresh预先读取的缓存数据，为None时由检查缓存阶段单独查询；
+    metadata为repositories表中仓库当前的pushed_at和stars
+    """
+    return {
+        "repo_name": repo_name,
+        "repo_url": repo_url,
+        "renew": renew,
+        "prefetched": prefetched,
+        "cached": cached,
+        "metadata": metadata or {},
+        "need_update_readme": renew_markdown,
+        "need_update_contributors": True,
+        "need_update_stars": True,
+        "cached_star_history": {},
+        "exceeded_limit": False,
+        "embedding": None,
+        "error": None,
+        # 初始化结果字典
+        "result": {
+            "name": repo_name,
+            "contributors": [],
+            "star_history": {},
+            "readme_content": "",
+            "failed_parts": [],
+        }
+    }
+
+# 各部分获取失败时打印的名称
+DETAIL_PART_LABELS = {"readme": "README", "contributors": "贡献者", "stars": "star历史"}
+
+def _detail_part_failed(task, part, error):
+    """
+    记录某一部分（readme / contributors / stars）获取失败
     
-    # 获取贡献者信息
-    result["contributors"] = get_contributors(repo_name, SETTINGS['headers'])
+    该部分不再视为需要更新：沿用缓存中的数据，不覆盖已保存的内容，也不写入对应的元数据，
+    下次运行时变化检测仍会重新获取；其他部分照常保存
+    """
+    print(f"{task['repo_name']} 获取{DETAIL_PART_LABELS[part]}失败，沿用上次的数据: {str(error)}")
+    task["result"]["failed_parts"].append(part)
+    task[f"need_update_{part}"] = False
+
+def _detail_check_cache(task, env):
+    """阶段：检查缓存，决定是否需要更新star历史和README"""
+    SETTINGS = env["SETTINGS"]
+    result = task["result"]
+    cached_data = task["cached"]
+    if cached_data is None:
+        cached_data = get_cached_data(task["repo_name"], env["qdrant_client"], env["collection_name"],
+                                      SETTINGS.get('cache_max_age_days', 1))
+        task["cached"] = cached_data
+    payload = cached_data.get("payload", {})
+    
+    # 缓存过期时保留旧的star历史，只增量获取最新的部分
+    if not task["renew"] and SETTINGS.get('incremental_star_history', True):
+        task["cached_star_history"] = payload.get("star_history", {})
+    
+    # Qdrant中已有向量对应的README哈希和嵌入模型，尚未写入README片段的旧数据视为需要重新生成
+    if payload.get("chunk_count") is not None:
+        task["cached_embedding_key"] = (payload.get("readme_hash"), payload.get("embedding_model"))
+    
+    # pushed_at没有变化，README和贡献者都沿用上次的结果
+    if cached_data.get("readme_unchanged") and not task["renew"]:
+        task["need_update_readme"] = False
+        task["need_update_contributors"] = False
+    
+    # 如果不需要更新README，则使用缓存的README内容
+    if not task["need_update_readme"]:
+        result["readme_content"] = payload.get("readme_content", "")
+    
+    # 如果有缓存且缓存是新鲜的（有变化检测结果时为star数没有变化）
+    if _stars_reused(cached_data) and not task["renew"]:
+        result["star_history"] = payload.get("star_history", {})
+        task["need_update_stars"] = False
+
+def _detail_fetch_readme(task, env):
+    """阶段：获取README内容，GraphQL没有找到README时退回REST接口"""
+    if not task["need_update_readme"]:
+        return
+    prefetched = task["prefetched"]
+    if prefetched and prefetched.get("readme_content"):
+        task["result"]["readme_content"] = clean_markdown(prefetched["readme_content"])
+        return
+    try:
+        task["result"]["readme_content"] = get_readme(task["repo_name"], env["SETTINGS"]['headers'], client=env["client"])
+    except Exception as e:
+        _detail_part_failed(task, "readme", e)
+        cached = task["cached"] or {}
+        payload = cached.get("payload", {})
+        # 计划阶段只为沿用README的仓库加载了readme_content，这里按需补充加载
+        if "readme_content" not in payload and cached.get("qdrant_id"):
+            loaded = load_cached_payloads([task["repo_name"]], env["qdrant_client"], env["collection_name"], ["readme_content"])
+            payload = loaded.get(task["repo_name"], {}).get("payload", {})
+        task["result"]["readme_content"] = payload.get("readme_content", "")
+
+def _detail_fetch_contributors(task, env):
+    """阶段：获取贡献者信息"""
+    if not task["need_update_contributors"]:
+        return
+    SETTINGS = env["SETTINGS"]
+    try:
+        task["result"]["contributors"] = get_contributors(
+            task["repo_name"],
+            SETTINGS['headers'],
+            client=env["client"],
+            max_contributors=SETTINGS.get('max_contributors'),
+            workers=SETTINGS.get('contributor_workers', 4)
+        )
+    except Exception as e:
+        # 不保存贡献者，MySQL中保留上次的贡献者列表
+        _detail_part_failed(task, "contributors", e)
+
+def _detail_fetch_stars(task, env):
+    """阶段：获取star历史，已有历史时增量获取"""
+    if not task["need_update_stars"]:
+        return
+    SETTINGS = env["SETTINGS"]
+    prefetched = task["prefetched"]
+    total_stars = prefetched.get("stargazers_count") if prefetched else None
     
-    # 保存贡献者信息到MySQL
-    save_contributors_to_db(result["contributors"], repo_name, repo_url, conn)
+    try:
+        if task["cached_star_history"]:
+            star_history, exceeded_limit = get_star_history_tail(
+                task["repo_name"],
+                SETTINGS['headers'],
+                task["cached_star_history"],
+                client=env["client"],
+                total_stars=total_stars,
+                mode=SETTINGS.get('star_history_mode', 'sequential'),
+                workers=SETTINGS.get('star_history_workers', 4),
+                sample_pages=SETTINGS.get('star_sample_pages', 50),
+                parallel_max_pages=SETTINGS.get('star_parallel_max_pages', 100)
+            )
+        else:
+            star_history, exceeded_limit = get_star_history(
+                task["repo_name"],
+                SETTINGS['headers'],
+                client=env["client"],
+                total_stars=total_stars,
+                mode=SETTINGS.get('star_history_mode', 'sequential'),
+                workers=SETTINGS.get('star_history_workers', 4),
+                sample_pages=SETTINGS.get('star_sample_pages', 50),
+                parallel_max_pages=SETTINGS.get('star_parallel_max_pages', 100)
+            )
+    except Exception as e:
+        _detail_part_failed(task, "stars", e)
+        task["result"]["star_history"] = (task["cached"] or {}).get("payload", {}).get("star_history", {})
+        return
+    task["result"]["star_history"] = star_history
+    task["exceeded_limit"] = exceeded_limit
+
+def _detail_embed(tasks, env):
+    """
+    阶段：为一批仓库的README及其片段批量创建嵌入向量
     
-    # 获取star历史
-    if need_update_stars:
-        star_history, exceeded_limit = get_star_history(repo_name, SETTINGS['headers'])
-        result["star_history"] = star_history
+    先按内容哈希查询嵌入缓存，只为未命中的文本调用嵌入接口；
+    README和模型都与Qdrant中已有的向量一致时，标记为向量未变化，片段也不再重新生成
+    """
+    SETTINGS = env["SETTINGS"]
+    tasks = [task for task in tasks if task["need_update_stars"] or task["need_update_readme"]]
+    if not tasks:
+        return
+    
+    conn = env["get_conn"]()
+    model_key = embedding_model_key(SETTINGS)
+    
+    # 需要向量的文本：整篇README和各个片段，按内容哈希去重
+    wanted = {}
+    for task in tasks:
+        readme_content = task["result"]["readme_content"]
+        task["readme_hash"] = readme_hash(readme_content)
+        task["vector_unchanged"] = task.get("cached_embedding_key") == (task["readme_hash"], model_key)
+        # README获取失败时Qdrant中已有的向量、README和片段都保持不变，只更新star历史
+        if "readme" in task["result"]["failed_parts"] and (task["cached"] or {}).get("qdrant_id"):
+            task["vector_unchanged"] = True
+        if task["vector_unchanged"]:
+            continue
         
-        # 如果超过API限制，添加到列表
-        if exceeded_limit:
-            exceeded_limit_repos.append(repo_name)
+        task["chunks"] = chunk_text(
+            readme_content,
+            SETTINGS.get('readme_chunk_size', 1000),
+            SETTINGS.get('readme_chunk_overlap', 200),
+            SETTINGS.get('readme_max_chunks', 50)
+        )
+        wanted[task["readme_hash"]] = readme_content
+        for chunk in task["chunks"]:
+            wanted[readme_hash(chunk)] = chunk
+    
+    if not wanted:
+        return
     
-    # 将数据存储到Qdrant和MySQL
-    if need_update_stars or need_update_readme:
+    vectors = embed_with_cache(conn, wanted, SETTINGS)
+    
+    for task in tasks:
+        if not task["vector_unchanged"]:
+            task["embedding"] = vectors.get(task["readme_hash"])
+            task["chunk_vectors"] = [(chunk, vectors.get(readme_hash(chunk))) for chunk in task["chunks"]]
+
+def _detail_metadata(task):
+    """
+    写入payload的元数据：获取了README才记录当前的pushed_at，获取了star历史才记录当前的stars，
+    未刷新的部分保留上次记录的值（upsert会覆盖整个payload）；
+    pushed_at同时决定是否重新获取贡献者，所以贡献者获取失败时也不记录新的pushed_at
+    """
+    payload = (task["cached"] or {}).get("payload", {})
+    metadata = {key: payload[key] for key in ("pushed_at", "stars") if payload.get(key) is not None}
+    readme_current = task["need_update_readme"] and "contributors" not in task["result"]["failed_parts"]
+    if readme_current and task["metadata"].get("pushed_at") is not None:
+        metadata["pushed_at"] = _isoformat(task["metadata"]["pushed_at"])
+    if task["need_update_stars"] and task["metadata"].get("stars") is not None:
+        metadata["stars"] = task["metadata"]["stars"]
+    return metadata
+
+def _detail_persist(task, env):
+    """阶段：保存贡献者到MySQL，将数据存储到Qdrant并更新映射关系"""
+    conn = env["get_conn"]()
+    result = task["result"]
+    
+    # 保存贡献者信息到MySQL，失败时与获取失败一样处理，不记录新的pushed_at
+    if task["need_update_contributors"]:
+        try:
+            save_contributors_to_db(result["contributors"], task["repo_name"], task["repo_url"], conn)
+        except Exception as e:
+            _detail_part_failed(task, "contributors", e)
+    
+    if task["need_update_stars"] or task["need_update_readme"]:
+        # README变化时重新写入片段
+        chunk_count = None
+        if "chunk_vectors" in task:
+            chunk_count = save_readme_chunks(task["repo_name"], task["chunk_vectors"], env["qdrant_client"], env["SETTINGS"])
+        
         # 保存到Qdrant
         qdrant_id = save_to_qdrant(
-            repo_name, 
+            task["repo_name"], 
             result["readme_content"], 
             result["star_history"], 
-            qdrant_client, 
-            collection_name, 
-            SETTINGS
+            env["qdrant_client"], 
+            env["collection_name"], 
+            env["SETTINGS"],
+            embedding=task["embedding"],
+            vector_unchanged=task.get("vector_unchanged", False),
+            chunk_count=chunk_count,
+            metadata=_detail_metadata(task)
         )
         
         # 更新MySQL中的映射关系
-        update_mysql_mapping(repo_name, qdrant_id, conn)
+        update_mysql_mapping(task["repo_name"], qdrant_id, conn)
+
+# 仓库详情的处理阶段，按执行顺序排列；embed阶段按批处理
+DETAIL_STAGES = [
+    ("readme", [_detail_check_cache, _detail_fetch_readme]),
+    ("contributors", [_detail_fetch_contributors]),
+    ("stars", [_detail_fetch_stars]),
+    ("embed", [_detail_embed]),
+    ("persist", [_detail_persist]),
+]
+DETAIL_BATCH_STAGES = {"embed"}
+
+def _staleness_hours(cached_entry, now, max_staleness_hours):
+    """距上次获取详情的小时数，从未获取过的仓库按max_staleness_hours计"""
+    last_updated = cached_entry.get("payload", {}).get("last_updated") if cached_entry else None
+    if not last_updated:
+        return max_staleness_hours
+    hours = (now - datetime.datetime.fromisoformat(last_updated)).total_seconds() / 3600
+    return min(max(hours, 0.0), max_staleness_hours)
+
+def estimate_detail_cost(repo, cached_entry, renew_markdown=True, renew=False, prefetched=None, SETTINGS=DEFAULT_SETTINGS):
+    """
+    估算刷新一个仓库的详情需要的GitHub API请求数
     
-    # 关闭数据库连接
-    conn.close()
+    README按1次计，贡献者按前max_contributors位所需的页数计（不限时按1页计）；
+    已有star历史时按增量页数计，否则按全量页数计（不超过STARGAZER_PAGE_CAP页，超过上限时按抽样页数计）
+    """
+    cached_entry = cached_entry or {}
+    payload = cached_entry.get("payload", {})
+    stars = repo.get('stars') or 0
+    per_page = 100
+    calls = 0
+    
+    readme_reused = not renew and cached_entry.get("readme_unchanged")
+    if renew_markdown and not readme_reused and not (prefetched and prefetched.get("readme_content")):
+        calls += 1
+    if not readme_reused:
+        calls += math.ceil(SETTINGS['max_contributors'] / per_page) if SETTINGS.get('max_contributors') else 1
+    
+    if renew or not _stars_reused(cached_entry):
+        if not renew and payload.get("star_history") and SETTINGS.get('incremental_star_history', True):
+            growth = max(stars - (payload.get("stars") or repo.get('stars_last_update') or 0), 0)
+            calls += math.ceil(growth / per_page) + 1
+        else:
+            pages = min(max(math.ceil(stars / per_page), 1), STARGAZER_PAGE_CAP)
+            mode = SETTINGS.get('star_history_mode', 'sequential')
+            sample_pages = SETTINGS.get('star_sample_pages', 50)
+            if mode == "sampled" or (mode == "parallel" and pages > SETTINGS.get('star_parallel_max_pages', 100)):
+                pages = min(pages, sample_pages)
+            calls += pages + 1
+    
+    return calls
+
+def schedule_detail_refresh(repos, cached, SETTINGS=DEFAULT_SETTINGS, renew_markdown=True, renew=False, prefetched=None):
+    """
+    按优先级排序需要刷新的仓库，并在本次运行的API预算内截断
+    
+    优先级 = 距上次获取详情的小时数 × (star增长数 + 1)：
+    增长快的仓库很快就会排到前面，增长停滞的仓库随着时间推移也会被刷新
+    
+    参数:
+        repos: 包含name、stars、stars_last_update的字典列表
+        cached: plan_detail_refresh返回的 {仓库全名: 缓存数据}，只调度其中的仓库
+        SETTINGS: 配置字典，detail_api_budget为本次运行的API请求预算（None表示不限），
+                  detail_max_staleness_hours为陈旧度的上限（从未获取过的仓库按该值计）
+        
+    返回:
+        (scheduled, deferred)，scheduled按优先级从高到低排列
+    """
+    prefetched = prefetched or {}
+    budget = SETTINGS.get('detail_api_budget')
+    max_staleness_hours = SETTINGS.get('detail_max_staleness_hours', 24 * 7)
+    now = datetime.datetime.now()
+    
+    scored = []
+    for repo in repos:
+        if repo['name'] not in cached:
+            continue
+        entry = cached[repo['name']]
+        growth = max((repo.get('stars') or 0) - (repo.get('stars_last_update') or 0), 0)
+        score = _staleness_hours(entry, now, max_staleness_hours) * (growth + 1)
+        cost = estimate_detail_cost(repo, entry, renew_markdown, renew, prefetched.get(repo['name']), SETTINGS)
+        scored.append((score, cost, repo))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    
+    scheduled = []
+    deferred = []
+    spent = 0
+    for score, cost, repo in scored:
+        # 预算不足时跳过代价大的仓库，继续尝试后面代价小的仓库
+        if budget is not None and spent + cost > budget:
+            deferred.append(repo)
+            continue
+        spent += cost
+        scheduled.append(repo)
+    
+    return scheduled, deferred
+
+def get_repo_details(repo_name,repo_url, SETTINGS=DEFAULT_SETTINGS, renew_markdown=True, renew = False, client=None, prefetched=None,
+                     session=None):
+    """
+    获取指定仓库的详细信息，包括贡献者、star增长记录、README文件内容
+    将star历史和README内容存储到Qdrant中，并在MySQL中建立映射关系
+    
+    参数:
+        repo_name: 仓库全名，格式为 "owner/repo"
+        SETTINGS: 配置字典，包含GitHub API的认证信息等
+        renew_markdown: 是否重新获取README内容，默认为True
+        client: 共享的GithubClient，默认使用进程内的默认客户端
+        prefetched: fetch_repos_graphql批量获取的该仓库数据，提供时直接使用其中的README和star数
+        session: 复用的DetailsSession，未提供时为本次调用临时创建一个
+        
+    返回:
+        包含仓库详细信息的字典，failed_parts中列出获取失败（沿用上次数据）的部分
+    """
+    own_session = session is None
+    if own_session:
+        session = DetailsSession(SETTINGS, client)
+    env = session.env
+    
+    # 依次执行各个阶段
+    task = _new_detail_task(repo_name, repo_url, renew_markdown, renew, prefetched)
+    try:
+        for name, stage_funcs in DETAIL_STAGES:
+            for func in stage_funcs:
+                func([task] if name in DETAIL_BATCH_STAGES else task, env)
+    finally:
+        if own_session:
+            session.close()
+    
+    # 超过API限制的项目列表
+    exceeded_limit_repos = [repo_name] if task["exceeded_limit"] else []
     
     # 返回结果和超过API限制的仓库列表
-    return result, exceeded_limit_repos
+    return task["result"], exceeded_limit_repos
+
+def get_repo_details_batch(repos, SETTINGS=DEFAULT_SETTINGS, renew_markdown=True, renew=False, client=None, prefetched=None,
+                           session=None, prefetch=None):
+    """
+    以分阶段流水线批量获取仓库详情
+    
+    获取README、获取贡献者、获取star历史、创建嵌入、写入数据库五个阶段各有独立的线程数
+    （SETTINGS['detail_stage_workers']），阶段之间用有界队列连接，
+    网络请求可以和嵌入、数据库写入同时进行
+    
+    参数:
+        repos: 包含name和url的字典列表，带有pushed_at和stars时启用变化检测，
+               stars和stars_last_update用于计算处理优先级
+        SETTINGS: 配置字典
+        renew_markdown: 是否重新获取README内容
+        renew: 是否忽略缓存
+        client: 共享的GithubClient，默认使用进程内的默认客户端
+        prefetched: {仓库全名: fetch_repos_graphql的结果}
+        session: 复用的DetailsSession，未提供时为本批创建一个并在结束后关闭
+        prefetch: 批量预取函数，接收本次安排处理的仓库全名列表，返回与prefetched相同格式的字典；
+                  在排定处理顺序之后调用，跳过和推迟的仓库不会被预取。
+                  调度时README按REST接口每个仓库1次请求估算，预取的请求数包含在预算之内
+        
+    返回:
+        包含处理数、成功数、失败数、跳过数（缓存新鲜无需处理）、推迟数（超出本次API预算）、
+        超过API限制的仓库列表和部分内容获取失败的仓库列表的字典
+    """
+    prefetched = prefetched or {}
+    stage_workers = SETTINGS.get('detail_stage_workers', {})
+    
+    # 整批共用一个会话：一个Qdrant客户端，每个线程各自持有一个MySQL连接
+    own_session = session is None
+    if own_session:
+        session = DetailsSession(SETTINGS, client)
+    env = session.env
+    
+    def make_stage(stage_funcs):
+        def run(task):
+            for func in stage_funcs:
+                func(task, env)
+        return run
+    
+    pipeline = StagePipeline(
+        [
+            (name, make_stage(funcs), stage_workers.get(name, 1),
+             SETTINGS.get('embedding_batch_size', 10) if name in DETAIL_BATCH_STAGES else 1)
+            for name, funcs in DETAIL_STAGES
+        ],
+        queue_size=SETTINGS.get('detail_queue_size', 16)
+    )
+    
+    # 初始化结果
+    result = {
+        "total": len(repos),
+        "processed": 0,
+        "success": 0,
+        "failed": 0,
+        "skipped": 0,
+        "deferred": 0,
+        "exceeded_limit_repos": [],
+        "partial_failed_repos": []
+    }
+    
+    valid_repos = [repo for repo in repos if repo.get('name')]
+    result["failed"] = len(repos) - len(valid_repos)
+    
+    # 仓库带有pushed_at和stars时启用变化检测
+    metadata = None
+    if SETTINGS.get('change_detection', True):
+        metadata = {
+            repo['name']: {"pushed_at": repo.get('pushed_at'), "stars": repo.get('stars')}
+            for repo in valid_repos
+            if 'pushed_at' in repo or 'stars' in repo
+        }
+    
+    # 开始网络请求之前，用批量查询判断整批仓库的缓存状态
+    cached, skipped = plan_detail_refresh(
+        [repo['name'] for repo in valid_repos],
+        session.qdrant_client,
+        session.collection_name,
+        renew_markdown,
+        renew,
+        SETTINGS.get('cache_max_age_days', 1),
+        metadata=metadata,
+        silence=False
+    )
+    result["skipped"] = len(skipped)
+    
+    # 按陈旧度和star增长排序，在API预算内安排本次处理的仓库
+    scheduled, deferred = schedule_detail_refresh(valid_repos, cached, SETTINGS, renew_markdown, renew, prefetched)
+    result["deferred"] = len(deferred)
+    
+    # 只为本次安排处理的仓库批量预取
+    if prefetch is not None and scheduled:
+        prefetched = {**prefetched, **prefetch([repo['name'] for repo in scheduled])}
+    
+    tasks = [
+        _new_detail_task(repo['name'], repo.get('url'), renew_markdown, renew, prefetched.get(repo['name']), cached[repo['name']],
+                         (metadata or {}).get(repo['name']))
+        for repo in scheduled
+    ]
+    
+    # 使用tqdm创建进度条
+    with tqdm(total=len(repos), initial=result["failed"] + result["skipped"] + result["deferred"], desc="处理仓库") as pbar:
+        def on_done(task):
+            result["processed"] += 1
+            pbar.set_description(f"完成: {task['repo_name']}")
+            if task["error"] is not None:
+                result["failed"] += 1
+                pbar.set_postfix({"状态": f"失败 - {str(task['error'])[:30]}..."})
+            else:
+                result["success"] += 1
+                # 部分内容获取失败的仓库，已保存的部分不受影响，下次运行重新获取失败的部分
+                if task["result"]["failed_parts"]:
+                    result["partial_failed_repos"].append(task["repo_name"])
+                # 添加超出API限制的仓库
+                if task["exceeded_limit"]:
+                    result["exceeded_limit_repos"].append(task["repo_name"])
+                    pbar.set_postfix({"状态": "成功 - 超出API限制"})
+                elif task["result"]["failed_parts"]:
+                    pbar.set_postfix({"状态": f"部分失败 - {','.join(task['result']['failed_parts'])}"})
+                else:
+                    pbar.set_postfix({"状态": "成功"})
+            pbar.update(1)
+        
+        try:
+            pipeline.run(tasks, on_done=on_done)
+        finally:
+            if own_session:
+                session.close()
+    
+    return result
 
 # 示例使用方法
 if __name__ == "__main__":
@@ -1004,7 +2341,7 @@ if __name__ == "__main__":
     conn=conn_init(DEFAULT_SETTINGS)
     cursor = conn.cursor(dictionary=True)
     query = """
-        SELECT name, url 
+        SELECT name, url, pushed_at, stars, stars_last_update
         from repositories
         where created_at>='2025-01-01'
     """
@@ -1018,61 +2355,27 @@ if __name__ == "__main__":
     conn.close()
 
     print(f"共找到 {len(repos)} 个仓库需要处理")
+    
+    # 使用GraphQL后端时，为本次安排处理的仓库批量获取README和star数
+    def prefetch_graphql(repo_names):
+        prefetched = fetch_repos_graphql(repo_names, DEFAULT_SETTINGS)
+        print(f"GraphQL批量获取了 {len(prefetched)} 个仓库的README和star数")
+        return prefetched
+    
+    prefetch = prefetch_graphql if DEFAULT_SETTINGS.get('details_backend') == 'graphql' else None
 
-    # 初始化结果
-    result = {
-        "total": len(repos),
-        "processed": 0,
-        "success": 0,
-        "failed": 0,
-        "exceeded_limit_repos": []
-    }
-
-    # 使用tqdm创建进度条
-    with tqdm(total=len(repos), desc="处理仓库") as pbar:
-        # 处理每个仓库
-        for repo in repos:
-            repo_name = repo.get('name')
-            repo_url = repo.get('url')
-            if not repo_name:
-                pbar.set_postfix({"状态": "跳过 - 无仓库名"})
-                result["failed"] += 1
-                pbar.update(1)
-                continue
-            
-            pbar.set_description(f"处理: {repo_name}")
-            
-            try:
-                # 调用get_repo_details函数获取仓库详情
-                repo_details, exceeded_repos = get_repo_details(repo_name, repo_url, DEFAULT_SETTINGS, renew_markdown=True)
-                
-                # 更新结果
-                result["processed"] += 1
-                result["success"] += 1
-                
-                # 添加超出API限制的仓库
-                if exceeded_repos:
-                    result["exceeded_limit_repos"].extend(exceeded_repos)
-                    pbar.set_postfix({"状态": "成功 - 超出API限制"})
-                else:
-                    pbar.set_postfix({"状态": "成功"})
-                
-                # 避免触发GitHub API限制，每个请求后等待一段时间
-                time.sleep(1.5)
-                
-            except Exception as e:
-                pbar.set_postfix({"状态": f"失败 - {str(e)[:30]}..."})
-                result["processed"] += 1
-                result["failed"] += 1
-            
-            pbar.update(1)
+    # 以流水线方式获取仓库详情
+    result = get_repo_details_batch(repos, DEFAULT_SETTINGS, renew_markdown=True, prefetch=prefetch)
 
     # 输出最终结果
     print("\n处理完成!")
     print(f"总共: {result['total']} 个仓库")
     print(f"成功: {result['success']} 个仓库")
     print(f"失败: {result['failed']} 个仓库")
+    print(f"跳过: {result['skipped']} 个仓库")
+    print(f"推迟到下次运行: {result['deferred']} 个仓库")
     print(f"超出API限制: {len(result['exceeded_limit_repos'])} 个仓库")
+    print(f"部分内容获取失败: {len(result['partial_failed_repos'])} 个仓库")
 
     # 如果有超出API限制的仓库，输出它们的名称
     if result["exceeded_limit_repos"]:
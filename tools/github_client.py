@@ -0,0 +1,141 @@
+"""
+GitHub API 客户端
+GitHub API client
+
+所有GitHub请求共用一个带连接池的Session：复用TLS连接、启用gzip压缩、
+对网络错误和5xx响应自动退避重试，并通过RateLimitBudget统一处理速率限制；
+配置了多个访问令牌时，每个请求使用当前额度最多的令牌。
+配置了ResponseCache时，可对单个请求启用ETag条件请求。
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tools.config import DEFAULT_SETTINGS
+from tools.rate_limit import RateLimitBudget
+from tools.http_cache import ResponseCache
+
+
+class GithubRequestError(Exception):
+    """GitHub请求返回了非预期的状态码"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(f"{message}，状态码: {status_code}" if status_code is not None else message)
+        self.status_code = status_code
+
+
+def default_pool_size(SETTINGS=DEFAULT_SETTINGS):
+    """
+    按配置的并发线程数估算同时进行的请求数：详情流水线中README阶段的每个线程一个请求，
+    贡献者和star阶段的每个线程各自再开一个分页线程池；仓库列表获取与详情获取不同时进行，取较大值
+    """
+    stages = SETTINGS.get('detail_stage_workers', {})
+    details = (stages.get('readme', 1)
+               + stages.get('contributors', 1) * SETTINGS.get('contributor_workers', 4)
+               + stages.get('stars', 1) * SETTINGS.get('star_history_workers', 4))
+    return max(details, SETTINGS.get('crawl_workers', 1))
+
+
+class GithubClient:
+    """持有连接池Session和速率预算的GitHub客户端，可在多个线程间共享"""
+
+    def __init__(self, SETTINGS=DEFAULT_SETTINGS, budget=None, cache=None):
+        """
+        参数:
+            SETTINGS: 配置字典，使用其中的headers、tokens和http_*连接参数
+            budget: 共享的RateLimitBudget，默认按SETTINGS['tokens']新建
+            cache: ResponseCache，默认按SETTINGS['http_cache_path']创建，未配置时不缓存
+        """
+        self.budget = budget or RateLimitBudget(tokens=SETTINGS.get('tokens'))
+        if cache is None and SETTINGS.get('http_cache_path'):
+            cache = ResponseCache(SETTINGS['http_cache_path'])
+        self.cache = cache
+        self.timeout = SETTINGS.get('http_timeout', 30)
+
+        retry = Retry(
+            total=SETTINGS.get('http_retries', 3),
+            backoff_factor=SETTINGS.get('http_backoff', 0.5),
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False
+        )
+        pool_size = SETTINGS.get('http_pool_size') or default_pool_size(SETTINGS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(SETTINGS['headers'])
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(self, method, url, resource="core", **kwargs):
+        """
+        发送请求，请求前从速率预算中取令牌，收到响应后用响应头刷新预算；
+        304响应不计入速率限制，归还请求前取出的额度；
+        因速率限制被拒绝时等待预算恢复后重试
+
+        参数:
+            method: HTTP方法
+            url: 请求地址
+            resource: 速率限制资源类型，core / search / graphql
+            kwargs: 透传给Session.request的参数（params、headers、json等）
+
+        返回:
+            requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        headers = dict(kwargs.pop("headers", None) or {})
+
+        while True:
+            token = self.budget.acquire(resource)
+            if token:
+                headers["Authorization"] = token
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            self.budget.update(response, resource, token)
+            if response.status_code == 304:
+                self.budget.release(token, resource)
+            if not self.budget.is_rate_limited(response):
+                return response
+
+    def get(self, url, params=None, headers=None, resource="core", conditional=False):
+        """
+        发送GET请求
+
+        参数:
+            conditional: 是否使用ETag条件请求，命中304时返回缓存的正文
+        """
+        if not conditional or self.cache is None:
+            return self.request("GET", url, resource=resource, params=params, headers=headers)
+
+        accept = (headers or {}).get("Accept", self.session.headers.get("Accept"))
+        key = ResponseCache.make_key(url, params, accept)
+        entry = self.cache.get(key)
+
+        request_headers = dict(headers or {})
+        if entry:
+            request_headers["If-None-Match"] = entry["etag"]
+
+        response = self.request("GET", url, resource=resource, params=params, headers=request_headers)
+        if response.status_code == 304 and entry:
+            return ResponseCache.to_response(entry)
+
+        self.cache.put(key, response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client(SETTINGS=DEFAULT_SETTINGS):
+    """获取进程内共享的默认客户端，首次调用时创建"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = GithubClient(SETTINGS)
+        return _default_client
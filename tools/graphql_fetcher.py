@@ -0,0 +1,113 @@
+"""
+GitHub GraphQL 批量获取
+Batched repository details via the GitHub GraphQL API
+
+用节点别名在一次GraphQL查询中获取多个仓库的README正文、star数、最近推送时间和topics，
+代替每个仓库分别调用README接口和search接口。
+"""
+from tools.config import DEFAULT_SETTINGS
+from tools.github_client import get_default_client
+
+# 依次尝试的README路径，都不存在时由调用方退回REST接口
+README_EXPRESSIONS = ("HEAD:README.md", "HEAD:readme.md", "HEAD:README")
+
+REPO_FIELDS = """
+    nameWithOwner
+    stargazerCount
+    pushedAt
+    repositoryTopics(first: 50) {{ nodes {{ topic {{ name }} }} }}
+    {readme_fields}
+"""
+
+
+def build_query(repo_names):
+    """
+    构建批量查询，每个仓库使用别名 r0、r1 ...，owner和name通过变量传入
+
+    返回:
+        (query, variables)
+    """
+    readme_fields = "\n    ".join(
+        f'readme{i}: object(expression: "{expression}") {{ ... on Blob {{ text }} }}'
+        for i, expression in enumerate(README_EXPRESSIONS)
+    )
+    fields = REPO_FIELDS.format(readme_fields=readme_fields)
+
+    declarations = []
+    selections = []
+    variables = {}
+    for i, repo_name in enumerate(repo_names):
+        owner, name = repo_name.split("/", 1)
+        declarations.append(f"$owner{i}: String!, $name{i}: String!")
+        selections.append(f"r{i}: repository(owner: $owner{i}, name: $name{i}) {{{fields}}}")
+        variables[f"owner{i}"] = owner
+        variables[f"name{i}"] = name
+
+    query = f"query({', '.join(declarations)}) {{\n" + "\n".join(selections) + "\n}"
+    return query, variables
+
+
+def _parse_repo(node):
+    """将单个仓库节点转换为与REST结果一致的字段"""
+    readme = ""
+    for i in range(len(README_EXPRESSIONS)):
+        blob = node.get(f"readme{i}")
+        if blob and blob.get("text"):
+            readme = blob["text"]
+            break
+
+    topics = [item["topic"]["name"] for item in (node.get("repositoryTopics") or {}).get("nodes", [])]
+
+    return {
+        "name": node.get("nameWithOwner"),
+        "readme_content": readme,
+        "stargazers_count": node.get("stargazerCount", 0),
+        "pushed_at": node.get("pushedAt"),
+        "topics": topics
+    }
+
+
+def fetch_repos_graphql(repo_names, SETTINGS=DEFAULT_SETTINGS, client=None, batch_size=50):
+    """
+    批量获取仓库的README原文、star数、推送时间和topics
+
+    参数:
+        repo_names: 仓库全名列表，格式为 "owner/repo"
+        SETTINGS: 配置字典，graphql_url可指向本地桩服务器用于测试
+        client: 共享的GithubClient，默认使用进程内的默认客户端
+        batch_size: 每次查询包含的仓库数
+
+    返回:
+        {仓库全名: 字段字典}，查询失败或不存在的仓库不包含在结果中
+    """
+    client = client or get_default_client(SETTINGS)
+    url = SETTINGS.get('graphql_url', 'https://api.github.com/graphql')
+    results = {}
+
+    for start in range(0, len(repo_names), batch_size):
+        batch = repo_names[start:start + batch_size]
+        query, variables = build_query(batch)
+
+        try:
+            response = client.request("POST", url, resource="graphql", json={"query": query, "variables": variables})
+        except Exception as e:
+            print(f"GraphQL请求异常: {e}")
+            continue
+
+        if response.status_code != 200:
+            print(f"GraphQL请求失败，状态码: {response.status_code}")
+            print(f"错误信息: {response.text}")
+            continue
+
+        body = response.json()
+        # 部分仓库不存在时GraphQL仍返回其余仓库的数据，错误记录在errors中
+        for error in body.get("errors", []) or []:
+            print(f"GraphQL错误: {error.get('message')}")
+
+        data = body.get("data") or {}
+        for i, repo_name in enumerate(batch):
+            node = data.get(f"r{i}")
+            if node:
+                results[repo_name] = _parse_repo(node)
+
+    return results
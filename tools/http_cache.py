@@ -0,0 +1,92 @@
+"""
+GitHub API 条件请求缓存
+On-disk ETag cache for GitHub API conditional requests
+
+以URL和查询参数为键，把响应的ETag和正文保存到本地SQLite文件。
+再次请求时携带 If-None-Match，GitHub返回304（不计入主速率限制）时直接使用缓存正文。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 随正文一起缓存的响应头，分页和内容类型在命中缓存时仍然需要
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+class ResponseCache:
+    """线程安全的ETag响应缓存"""
+
+    def __init__(self, path):
+        """
+        参数:
+            path: SQLite缓存文件路径，目录不存在时自动创建
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            cache_key TEXT PRIMARY KEY,
+            url TEXT,
+            etag TEXT,
+            headers TEXT,
+            body BLOB,
+            stored_at REAL
+        )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url, params=None, accept=None):
+        """根据URL、排序后的查询参数和Accept头生成缓存键"""
+        raw = json.dumps([url, sorted((params or {}).items()), accept or ""], default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取缓存条目，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, etag, headers, body FROM responses WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"url": row[0], "etag": row[1], "headers": json.loads(row[2]), "body": row[3]}
+
+    def put(self, key, response):
+        """保存带ETag的200响应"""
+        etag = response.headers.get("ETag")
+        if response.status_code != 200 or not etag:
+            return
+
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, url, etag, headers, body, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response.url, etag, json.dumps(headers), response.content, time.time())
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def to_response(entry):
+        """把缓存条目还原为状态码200的requests.Response"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = entry["body"]
+        response.encoding = "utf-8"
+        response.from_cache = True
+        return response
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,435 @@
+"""
+数据库结构迁移
+Versioned schema migrations
+
+create_tables只负责建立初始表结构，之后的结构变更（索引、新表、列）都写成带版本号的迁移。
+schema_version表记录已经应用的版本，每次只执行尚未应用的迁移；
+迁移步骤本身也是幂等的（先检查索引、列是否存在），中途失败后重新执行是安全的。
+
+用法:
+    python -m tools.migrations
+"""
+import datetime
+
+# (版本号, 说明, 迁移函数) 的列表，按版本号递增排列
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """注册一个迁移，迁移函数接收一个游标"""
+    def register(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"迁移版本号必须递增: {version}")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+def table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table, index_name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index_name))
+    return cursor.fetchone()[0] > 0
+
+
+def add_index(cursor, table, index_name, columns, unique=False):
+    """索引不存在时创建"""
+    if index_exists(cursor, table, index_name):
+        return
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX `{index_name}` ON `{table}` ({column_list})")
+
+
+def primary_key_columns(cursor, table):
+    """主键包含的列，按顺序返回"""
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY'
+        ORDER BY SEQ_IN_INDEX
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def drop_index(cursor, table, index_name):
+    """索引存在时删除"""
+    if index_exists(cursor, table, index_name):
+        cursor.execute(f"DROP INDEX `{index_name}` ON `{table}`")
+
+
+def add_column(cursor, table, column, definition):
+    """列不存在时添加"""
+    if column_exists(cursor, table, column):
+        return
+    cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+
+
+@migration(1, "repositories表的二级索引")
+def _repository_indexes(cursor):
+    # 按仓库名查询（RAG的仓库详情、贡献者子查询）
+    add_index(cursor, "repositories", "idx_repositories_name", ["name"])
+    # 按创建时间筛选和按年份分组（2025年仓库、增长最快的仓库、详情刷新列表）
+    add_index(cursor, "repositories", "idx_repositories_created_at", ["created_at", "stars", "stars_last_update"])
+    # 按star数和fork数筛选后按年份统计，索引覆盖整个查询
+    add_index(cursor, "repositories", "idx_repositories_stars_forks", ["stars", "forks", "created_at"])
+    # 语言河流图按语言和年份分组
+    add_index(cursor, "repositories", "idx_repositories_language_created", ["language", "created_at"])
+
+
+@migration(2, "repo_qdrant_mapping补充last_updated列")
+def _mapping_last_updated(cursor):
+    # update_mysql_mapping写入last_updated，但最初的表结构中没有这一列
+    add_column(cursor, "repo_qdrant_mapping", "last_updated", "DATETIME NULL")
+
+
+@migration(3, "topics字典表和repo_topics关联表")
+def _normalized_topics(cursor):
+    # 为repositories增加整数代理键，供关联表引用（主键仍为url）
+    if not column_exists(cursor, "repositories", "id"):
+        cursor.execute("""
+        ALTER TABLE repositories
+            ADD COLUMN id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            ADD UNIQUE KEY uk_repositories_id (id)
+        """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS topics (
+        id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        UNIQUE KEY uk_topics_name (name)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS repo_topics (
+        repo_id INT UNSIGNED NOT NULL,
+        topic_id INT UNSIGNED NOT NULL,
+        PRIMARY KEY (repo_id, topic_id),
+        KEY idx_repo_topics_topic (topic_id, repo_id)
+    )
+    """)
+
+    # 根据已有的topics列按id分批回填；按该版本的表结构写在这里，不依赖之后会变化的tools.topics
+    last_id = 0
+    while True:
+        cursor.execute("SELECT id, topics FROM repositories WHERE id > %s ORDER BY id LIMIT 1000", (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        repo_topics = {repo_id: {topic for topic in (topics or "").split(",") if topic} for repo_id, topics in rows}
+        names = sorted(set().union(*repo_topics.values()))
+        if not names:
+            continue
+
+        placeholders = ", ".join(["%s"] * len(names))
+        cursor.execute(f"INSERT IGNORE INTO topics (name) VALUES {', '.join(['(%s)'] * len(names))}", names)
+        cursor.execute(f"SELECT name, id FROM topics WHERE name IN ({placeholders})", names)
+        topic_ids = {name.lower(): topic_id for name, topic_id in cursor.fetchall()}
+
+        pairs = sorted({(repo_id, topic_ids[topic.lower()]) for repo_id, topics in repo_topics.items() for topic in topics})
+        cursor.execute(
+            f"INSERT IGNORE INTO repo_topics (repo_id, topic_id) VALUES {', '.join(['(%s, %s)'] * len(pairs))}",
+            [value for pair in pairs for value in pair]
+        )
+
+
+@migration(4, "看板汇总表")
+def _rollup_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_repo_year (
+        year SMALLINT NOT NULL,
+        star_bucket INT NOT NULL,
+        fork_bucket INT NOT NULL,
+        num INT NOT NULL,
+        PRIMARY KEY (year, star_bucket, fork_bucket)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_language_year (
+        language VARCHAR(100) NOT NULL,
+        year SMALLINT NOT NULL,
+        num INT NOT NULL,
+        PRIMARY KEY (language, year)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_topic_year (
+        topic_id INT UNSIGNED NOT NULL,
+        year SMALLINT NOT NULL,
+        num INT NOT NULL,
+        PRIMARY KEY (topic_id, year),
+        KEY idx_rollup_topic_year_year (year, topic_id, num)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_topic_pairs (
+        topic_a INT UNSIGNED NOT NULL,
+        topic_b INT UNSIGNED NOT NULL,
+        num INT NOT NULL,
+        PRIMARY KEY (topic_a, topic_b),
+        KEY idx_rollup_topic_pairs_num (num)
+    )
+    """)
+
+    # 首次计算，之后由get_top_starred_repos在每次抓取完成后刷新；
+    # 按该版本的分档和共现阈值写在这里，不依赖之后会变化的tools.rollups
+    cursor.execute("DELETE FROM rollup_repo_year")
+    cursor.execute("""
+        INSERT INTO rollup_repo_year (year, star_bucket, fork_bucket, num)
+        SELECT YEAR(created_at),
+            CASE WHEN stars >= 100000 THEN 100000 WHEN stars >= 50000 THEN 50000 WHEN stars >= 10000 THEN 10000
+                 WHEN stars >= 5000 THEN 5000 WHEN stars >= 1000 THEN 1000 WHEN stars >= 500 THEN 500
+                 WHEN stars >= 100 THEN 100 ELSE 0 END,
+            CASE WHEN forks >= 10000 THEN 10000 WHEN forks >= 5000 THEN 5000 WHEN forks >= 1000 THEN 1000
+                 WHEN forks >= 500 THEN 500 WHEN forks >= 100 THEN 100 WHEN forks >= 50 THEN 50
+                 WHEN forks >= 10 THEN 10 ELSE 0 END,
+            COUNT(*)
+        FROM repositories
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    cursor.execute("DELETE FROM rollup_language_year")
+    cursor.execute("""
+        INSERT INTO rollup_language_year (language, year, num)
+        SELECT COALESCE(`language`, ''), YEAR(created_at), COUNT(*)
+        FROM repositories
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    cursor.execute("DELETE FROM rollup_topic_year")
+    cursor.execute("""
+        INSERT INTO rollup_topic_year (topic_id, year, num)
+        SELECT rt.topic_id, YEAR(r.created_at), COUNT(*)
+        FROM repo_topics rt
+        JOIN repositories r ON r.id = rt.repo_id
+        WHERE r.created_at IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    cursor.execute("DELETE FROM rollup_topic_pairs")
+    cursor.execute("""
+        INSERT INTO rollup_topic_pairs (topic_a, topic_b, num)
+        SELECT a.topic_id, b.topic_id, COUNT(*)
+        FROM repo_topics a
+        JOIN repo_topics b ON b.repo_id = a.repo_id AND b.topic_id > a.topic_id
+        GROUP BY a.topic_id, b.topic_id
+        HAVING COUNT(*) >= 10
+    """)
+
+
+@migration(5, "贡献者表和按star加权的贡献者排行表")
+def _top_contributors(cursor):
+    # 最初的create_tables没有创建贡献者相关的表
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS contributors (
+        url VARCHAR(255) PRIMARY KEY,
+        login VARCHAR(255),
+        avatar_url VARCHAR(255)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS repo_contributors (
+        contributor_url VARCHAR(255) NOT NULL,
+        repo_url VARCHAR(255) NOT NULL,
+        contributions INT,
+        PRIMARY KEY (repo_url, contributor_url)
+    )
+    """)
+    add_column(cursor, "repo_contributors", "allocated_star", "DOUBLE NOT NULL DEFAULT 0")
+    add_index(cursor, "repo_contributors", "idx_repo_contributors_contributor", ["contributor_url", "allocated_star"])
+
+    # 旧部署中top_contributors可能是视图，替换为实体表
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.VIEWS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'top_contributors'
+    """)
+    if cursor.fetchone()[0] > 0:
+        cursor.execute("DROP VIEW top_contributors")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS top_contributors (
+        curl VARCHAR(255) PRIMARY KEY,
+        total_allocated_star DOUBLE NOT NULL,
+        updated_at DATETIME,
+        KEY idx_top_contributors_score (total_allocated_star)
+    )
+    """)
+
+    # 按该版本的表结构（以url关联）全量计算，不依赖之后会变化的tools.top_contributors
+    cursor.execute("""
+        UPDATE repo_contributors rc
+        JOIN (
+            SELECT repo_url, SUM(contributions) AS total
+            FROM repo_contributors
+            GROUP BY repo_url
+        ) t ON t.repo_url = rc.repo_url
+        JOIN repositories r ON r.url = rc.repo_url
+        SET rc.allocated_star = COALESCE(r.stars * rc.contributions / NULLIF(t.total, 0), 0)
+    """)
+    cursor.execute("DELETE FROM top_contributors")
+    cursor.execute("""
+        INSERT INTO top_contributors (curl, total_allocated_star, updated_at)
+        SELECT contributor_url, SUM(allocated_star), NOW()
+        FROM repo_contributors
+        GROUP BY contributor_url
+    """)
+
+
+@migration(6, "仓库和贡献者改用整数主键，关联表以整数id关联")
+def _integer_keys(cursor):
+    # repositories：主键改为id，url改为唯一索引（按url的upsert仍然生效）
+    add_index(cursor, "repositories", "uk_repositories_url", ["url"], unique=True)
+    if primary_key_columns(cursor, "repositories") != ["id"]:
+        cursor.execute("ALTER TABLE repositories DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    drop_index(cursor, "repositories", "uk_repositories_id")
+
+    # contributors：增加自增id作为主键，url改为唯一索引
+    if not column_exists(cursor, "contributors", "id"):
+        cursor.execute("""
+        ALTER TABLE contributors
+            ADD COLUMN id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+            ADD UNIQUE KEY uk_contributors_id (id)
+        """)
+    add_index(cursor, "contributors", "uk_contributors_url", ["url"], unique=True)
+    if primary_key_columns(cursor, "contributors") != ["id"]:
+        drop_primary_key = "DROP PRIMARY KEY, " if primary_key_columns(cursor, "contributors") else ""
+        cursor.execute(f"ALTER TABLE contributors {drop_primary_key}ADD PRIMARY KEY (id)")
+    drop_index(cursor, "contributors", "uk_contributors_id")
+
+    # repo_contributors：用url换算出整数id后删除url列
+    if column_exists(cursor, "repo_contributors", "repo_url"):
+        add_column(cursor, "repo_contributors", "repo_id", "INT UNSIGNED NULL")
+        add_column(cursor, "repo_contributors", "contributor_id", "INT UNSIGNED NULL")
+        cursor.execute("""
+            UPDATE repo_contributors rc
+            JOIN repositories r ON r.url = rc.repo_url
+            SET rc.repo_id = r.id
+        """)
+        cursor.execute("""
+            UPDATE repo_contributors rc
+            JOIN contributors c ON c.url = rc.contributor_url
+            SET rc.contributor_id = c.id
+        """)
+        # 找不到对应仓库或贡献者的关系无法保留
+        cursor.execute("DELETE FROM repo_contributors WHERE repo_id IS NULL OR contributor_id IS NULL")
+
+        drop_index(cursor, "repo_contributors", "idx_repo_contributors_contributor")
+        drop_primary_key = "DROP PRIMARY KEY, " if primary_key_columns(cursor, "repo_contributors") else ""
+        cursor.execute(f"""
+        ALTER TABLE repo_contributors
+            {drop_primary_key}
+            DROP COLUMN repo_url,
+            DROP COLUMN contributor_url,
+            MODIFY repo_id INT UNSIGNED NOT NULL,
+            MODIFY contributor_id INT UNSIGNED NOT NULL,
+            ADD PRIMARY KEY (repo_id, contributor_id)
+        """)
+    add_index(cursor, "repo_contributors", "idx_repo_contributors_contributor_id", ["contributor_id", "allocated_star"])
+
+    # top_contributors：按contributor_id保存，展示时关联contributors取url
+    if column_exists(cursor, "top_contributors", "curl"):
+        cursor.execute("DROP TABLE top_contributors")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS top_contributors (
+        contributor_id INT UNSIGNED PRIMARY KEY,
+        total_allocated_star DOUBLE NOT NULL,
+        updated_at DATETIME,
+        KEY idx_top_contributors_score (total_allocated_star)
+    )
+    """)
+
+    # 按该版本的表结构（以整数id关联）全量计算，不依赖之后会变化的tools.top_contributors
+    cursor.execute("""
+        UPDATE repo_contributors rc
+        JOIN (
+            SELECT repo_id, SUM(contributions) AS total
+            FROM repo_contributors
+            GROUP BY repo_id
+        ) t ON t.repo_id = rc.repo_id
+        JOIN repositories r ON r.id = rc.repo_id
+        SET rc.allocated_star = COALESCE(r.stars * rc.contributions / NULLIF(t.total, 0), 0)
+    """)
+    cursor.execute("DELETE FROM top_contributors")
+    cursor.execute("""
+        INSERT INTO top_contributors (contributor_id, total_allocated_star, updated_at)
+        SELECT contributor_id, SUM(allocated_star), NOW()
+        FROM repo_contributors
+        GROUP BY contributor_id
+    """)
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(255),
+        applied_at DATETIME
+    )
+    """)
+
+
+def current_version(cursor):
+    """已应用的最高版本号，没有应用过任何迁移时为0"""
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def migrate(conn, target=None, silence=True):
+    """
+    依次执行尚未应用的迁移
+
+    MySQL的DDL语句会隐式提交，因此每个迁移完成后立即记录版本号，
+    失败时停在出错的迁移，之前的版本保持已应用状态
+
+    参数:
+        conn: 已选择数据库的MySQL连接
+        target: 迁移到的版本号，None表示最新版本
+        silence: 是否静默执行
+
+    返回:
+        本次应用的版本号列表
+    """
+    cursor = conn.cursor(buffered=True)
+    applied = []
+    try:
+        version = current_version(cursor)
+        for migration_version, description, func in MIGRATIONS:
+            if migration_version <= version or (target is not None and migration_version > target):
+                continue
+
+            if not silence:
+                print(f"应用迁移 {migration_version}: {description}")
+            func(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                (migration_version, description, datetime.datetime.now())
+            )
+            conn.commit()
+            applied.append(migration_version)
+    finally:
+        cursor.close()
+
+    return applied
+
+
+if __name__ == "__main__":
+    from tools.get_data import create_tables
+
+    # create_tables建立初始表结构后执行全部迁移
+    create_tables(silence=False)
@@ -0,0 +1,119 @@
+"""
+分阶段并发流水线
+Staged concurrent pipeline
+
+每个阶段有自己的工作线程数，相邻阶段之间用有界队列连接：
+网络请求阶段可以和嵌入、数据库写入阶段同时进行，队列满时上游自动等待。
+"""
+import queue
+import threading
+
+# 队列结束标记
+_STOP = object()
+
+
+class StagePipeline:
+    """
+    多阶段流水线
+
+    每个阶段是一个 func(item) 函数，直接修改item（通常是字典）；
+    批大小大于1的阶段一次收集多个item，调用 func(items)；
+    某个阶段抛出异常时，把异常记录在 item["error"] 中，后续阶段跳过该item，
+    但item仍会流到最后，由调用方统计失败数
+    """
+
+    def __init__(self, stages, queue_size=16, batch_wait=0.5):
+        """
+        参数:
+            stages: (阶段名称, 处理函数, 线程数[, 批大小]) 的列表，按执行顺序排列
+            queue_size: 阶段之间队列的容量
+            batch_wait: 批处理阶段凑批时最多等待的秒数
+        """
+        self.stages = [tuple(stage) + (1,) * (4 - len(stage)) for stage in stages]
+        self.queue_size = queue_size
+        self.batch_wait = batch_wait
+
+    def _next_batch(self, in_queue, batch_size):
+        """取出一批item，队列暂时为空时最多等待batch_wait秒；遇到结束标记时返回 (批, True)"""
+        batch = []
+        while len(batch) < batch_size:
+            try:
+                item = in_queue.get() if not batch else in_queue.get(timeout=self.batch_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, func, batch_size, in_queue, out_queue, stage_state):
+        stopped = False
+        while not stopped:
+            batch, stopped = self._next_batch(in_queue, batch_size)
+
+            pending = [item for item in batch if item.get("error") is None]
+            if pending:
+                try:
+                    func(pending if batch_size > 1 else pending[0])
+                except Exception as e:
+                    for item in pending:
+                        item["error"] = e
+            for item in batch:
+                out_queue.put(item)
+
+        # 本阶段最后一个线程退出时，通知下一阶段的所有线程结束
+        with stage_state["lock"]:
+            stage_state["alive"] -= 1
+            if stage_state["alive"] == 0:
+                for _ in range(stage_state["next_workers"]):
+                    out_queue.put(_STOP)
+
+    def run(self, items, on_done=None):
+        """
+        运行流水线
+
+        参数:
+            items: 待处理的item列表
+            on_done: 每个item走完所有阶段后在调用线程中执行的回调
+
+        返回:
+            处理完成的item列表（顺序与完成顺序一致）
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        for i, (name, func, workers, batch_size) in enumerate(self.stages):
+            next_workers = self.stages[i + 1][2] if i + 1 < len(self.stages) else 1
+            stage_state = {"lock": threading.Lock(), "alive": workers, "next_workers": next_workers}
+            for j in range(workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(func, batch_size, queues[i], queues[i + 1], stage_state),
+                    name=f"{name}-{j}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            for _ in range(self.stages[0][2]):
+                queues[0].put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+        feeder.start()
+
+        finished = []
+        while True:
+            item = queues[-1].get()
+            if item is _STOP:
+                break
+            finished.append(item)
+            if on_done:
+                on_done(item)
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+        return finished
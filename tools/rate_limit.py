@@ -0,0 +1,143 @@
+"""
+GitHub API 速率预算
+Shared GitHub API rate-limit budget
+
+所有并发请求共用一个令牌桶集合，按（访问令牌, 资源）划分，资源为 core / search / graphql，
+桶内额度由响应头 X-RateLimit-Remaining / X-RateLimit-Reset 刷新。
+配置了多个访问令牌时，每次请求选择当前资源剩余额度最多的令牌。
+"""
+import threading
+import time
+
+
+class RateLimitBudget:
+    """
+    线程安全的多令牌速率令牌桶
+
+    每次请求前调用 acquire 选出一个访问令牌并消耗一个额度，所有令牌都耗尽时阻塞到最早的重置时间；
+    每次收到响应后调用 update，用响应头校正该令牌的剩余额度和重置时间。
+    """
+
+    def __init__(self, tokens=None, reserve=0, reset_buffer=1.0, silence=True):
+        """
+        参数:
+            tokens: 访问令牌列表（Authorization头的值），为空时只有一个使用Session默认头部的匿名槽位None
+            reserve: 每个令牌每个资源保留不用的额度，留给其他脚本
+            reset_buffer: 重置时间之后额外等待的秒数，避免时钟误差
+            silence: 是否静默等待（不打印等待信息）
+        """
+        self.tokens = list(tokens) if tokens else [None]
+        self.reserve = reserve
+        self.reset_buffer = reset_buffer
+        self.silence = silence
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._paused_until = {}
+
+    def _bucket(self, token, resource):
+        return self._buckets.setdefault((token, resource), {
+            "limit": None,
+            "remaining": None,
+            "reset": 0.0,
+        })
+
+    def _headroom(self, token, resource, now):
+        """令牌在该资源上的可用额度，未知时视为无穷大（优先探测）"""
+        bucket = self._bucket(token, resource)
+
+        # 重置时间已过，桶按上一次看到的上限补满
+        if bucket["reset"] and now >= bucket["reset"] + self.reset_buffer:
+            bucket["remaining"] = bucket["limit"]
+            bucket["reset"] = 0.0
+
+        if now < self._paused_until.get(token, 0.0):
+            return 0
+        if bucket["remaining"] is None:
+            return float("inf")
+        return bucket["remaining"] - self.reserve
+
+    def _next_available(self, token, resource, now):
+        """令牌恢复额度的时间点"""
+        bucket = self._bucket(token, resource)
+        resume_at = self._paused_until.get(token, 0.0)
+        if bucket["remaining"] is not None and bucket["remaining"] <= self.reserve:
+            resume_at = max(resume_at, bucket["reset"] + self.reset_buffer if bucket["reset"] else now + 1.0)
+        return resume_at
+
+    def acquire(self, resource="core"):
+        """
+        选出剩余额度最多的令牌并消耗一个额度，额度不足时阻塞等待
+
+        返回:
+            选中的访问令牌（未配置令牌时为None）
+        """
+        with self._cond:
+            announced = False
+            while True:
+                now = time.time()
+                headroom = {token: self._headroom(token, resource, now) for token in self.tokens}
+                token = max(self.tokens, key=lambda t: headroom[t])
+
+                if headroom[token] > 0:
+                    bucket = self._bucket(token, resource)
+                    if bucket["remaining"] is not None:
+                        bucket["remaining"] -= 1
+                    return token
+
+                wait_time = min(self._next_available(t, resource, now) for t in self.tokens) - now
+                if not announced and not self.silence:
+                    print(f"{resource} 额度已用完，等待 {wait_time:.0f} 秒后继续...")
+                    announced = True
+                self._cond.wait(timeout=max(wait_time, 0.05))
+
+    def release(self, token=None, resource="core"):
+        """归还acquire消耗的一个额度，用于不计入速率限制的响应（如条件请求命中的304）"""
+        with self._cond:
+            bucket = self._bucket(token, resource)
+            if bucket["remaining"] is not None:
+                bucket["remaining"] += 1
+                if bucket["limit"] is not None:
+                    bucket["remaining"] = min(bucket["remaining"], bucket["limit"])
+            self._cond.notify_all()
+
+    def update(self, response, resource="core", token=None):
+        """根据响应头刷新令牌的额度"""
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", resource)
+
+        with self._cond:
+            if "Retry-After" in headers and response.status_code in (403, 429):
+                # 触发二级速率限制，该令牌的所有资源一起暂停
+                self._paused_until[token] = max(self._paused_until.get(token, 0.0),
+                                                time.time() + int(headers["Retry-After"]))
+
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                bucket = self._bucket(token, resource)
+                remaining = int(headers["X-RateLimit-Remaining"])
+                reset = float(headers["X-RateLimit-Reset"])
+                bucket["limit"] = int(headers.get("X-RateLimit-Limit", bucket["limit"] or remaining))
+
+                if reset > bucket["reset"] or bucket["remaining"] is None:
+                    # 新的计费窗口，以服务器返回的额度为准
+                    bucket["remaining"] = remaining
+                    bucket["reset"] = reset
+                else:
+                    # 同一窗口内响应可能乱序到达，保留较小值（本地已扣除在途请求）
+                    bucket["remaining"] = min(bucket["remaining"], remaining)
+
+            self._cond.notify_all()
+
+    def remaining(self, resource="core"):
+        """所有令牌在该资源上已知的剩余额度之和，没有任何令牌的额度已知时返回None"""
+        with self._cond:
+            now = time.time()
+            known = [self._headroom(token, resource, now) for token in self.tokens]
+            known = [value for value in known if value != float("inf")]
+            return sum(max(value, 0) for value in known) if known else None
+
+    @staticmethod
+    def is_rate_limited(response):
+        """判断响应是否因速率限制被拒绝"""
+        if response.status_code not in (403, 429):
+            return False
+        return response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
@@ -0,0 +1,119 @@
+"""
+看板汇总表
+Dashboard rollup tables
+
+get_top_starred_repos完成后重新计算可视化页面使用的统计结果，写入汇总表：
+- rollup_repo_year: 每年按star数、fork数分档的仓库数
+- rollup_language_year: 每年每种语言的仓库数
+- rollup_topic_year: 每年每个topic的仓库数
+- rollup_topic_pairs: 两个topic在同一仓库中共同出现的次数（只保留达到ROLLUP_MIN_PAIR_COUNT的组合）
+
+每张表在一个事务内先删除再插入，刷新过程中读取方仍能看到旧数据。
+刷新时间和行数记录在log表中。
+
+用法:
+    python -m tools.rollups
+"""
+import datetime
+
+# star数、fork数的分档下限，看板按 >= 某个分档下限筛选时可直接使用汇总表
+STAR_BUCKETS = [0, 100, 500, 1000, 5000, 10000, 50000, 100000]
+FORK_BUCKETS = [0, 10, 50, 100, 500, 1000, 5000, 10000]
+
+# topic共现次数低于该值的组合不写入汇总表
+ROLLUP_MIN_PAIR_COUNT = 10
+
+
+def _bucket_expression(column, buckets):
+    """把数值列映射为所在分档下限的CASE表达式"""
+    cases = " ".join(f"WHEN {column} >= {bucket} THEN {bucket}" for bucket in sorted(buckets, reverse=True) if bucket > 0)
+    return f"CASE {cases} ELSE 0 END"
+
+
+ROLLUP_QUERIES = {
+    "rollup_repo_year": f"""
+        INSERT INTO rollup_repo_year (year, star_bucket, fork_bucket, num)
+        SELECT YEAR(created_at), {_bucket_expression('stars', STAR_BUCKETS)}, {_bucket_expression('forks', FORK_BUCKETS)}, COUNT(*)
+        FROM repositories
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    """,
+    "rollup_language_year": """
+        INSERT INTO rollup_language_year (language, year, num)
+        SELECT COALESCE(`language`, ''), YEAR(created_at), COUNT(*)
+        FROM repositories
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2
+    """,
+    "rollup_topic_year": """
+        INSERT INTO rollup_topic_year (topic_id, year, num)
+        SELECT rt.topic_id, YEAR(r.created_at), COUNT(*)
+        FROM repo_topics rt
+        JOIN repositories r ON r.id = rt.repo_id
+        WHERE r.created_at IS NOT NULL
+        GROUP BY 1, 2
+    """,
+    "rollup_topic_pairs": f"""
+        INSERT INTO rollup_topic_pairs (topic_a, topic_b, num)
+        SELECT a.topic_id, b.topic_id, COUNT(*)
+        FROM repo_topics a
+        JOIN repo_topics b ON b.repo_id = a.repo_id AND b.topic_id > a.topic_id
+        GROUP BY a.topic_id, b.topic_id
+        HAVING COUNT(*) >= {ROLLUP_MIN_PAIR_COUNT}
+    """,
+}
+
+
+def refresh_rollups(conn, tables=None, silence=True):
+    """
+    重新计算汇总表
+
+    参数:
+        conn: MySQL连接
+        tables: 需要刷新的汇总表名列表，None表示全部
+        silence: 是否静默执行
+
+    返回:
+        {汇总表名: 行数}
+    """
+    cursor = conn.cursor()
+    counts = {}
+    try:
+        for table in tables or ROLLUP_QUERIES:
+            start = datetime.datetime.now()
+            try:
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(ROLLUP_QUERIES[table])
+                counts[table] = cursor.rowcount
+
+                cursor.execute("""
+                INSERT INTO log (table_name, last_update, records_total)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    last_update = VALUES(last_update),
+                    records_total = VALUES(records_total)
+                """, (table, datetime.datetime.now(), counts[table]))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"刷新汇总表 {table} 失败: {str(e)}")
+                continue
+
+            if not silence:
+                seconds = (datetime.datetime.now() - start).total_seconds()
+                print(f"已刷新汇总表 {table}: {counts[table]} 行，用时 {seconds:.1f} 秒")
+    finally:
+        cursor.close()
+
+    return counts
+
+
+if __name__ == "__main__":
+    from tools.config import DEFAULT_SETTINGS
+    from tools.get_data import conn_init
+
+    conn = conn_init(DEFAULT_SETTINGS)
+    try:
+        refresh_rollups(conn, silence=False)
+    finally:
+        conn.close()
@@ -0,0 +1,115 @@
+"""
+按star加权的贡献者排行
+Star-weighted top contributors aggregate
+
+每个仓库的star数按贡献次数比例分配给该仓库的贡献者，记录在repo_contributors.allocated_star中；
+top_contributors表保存每位贡献者在所有仓库上分配到的star之和，看板按索引读取前N名。
+
+贡献者列表或仓库star数变化时，只重新计算受影响仓库的分配值和这些仓库贡献者的总分；
+rebuild_top_contributors 全量重建。
+
+用法:
+    python -m tools.top_contributors
+"""
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def refresh_repo_allocations(cursor, repo_ids, batch_size=500):
+    """按仓库当前的star数和贡献次数重新计算这些仓库的allocated_star"""
+    repo_ids = list(repo_ids)
+    for i in range(0, len(repo_ids), batch_size):
+        batch = repo_ids[i:i + batch_size]
+        # 带GROUP BY的派生表会被物化，可以在UPDATE中引用同一张表
+        cursor.execute(f"""
+            UPDATE repo_contributors rc
+            JOIN (
+                SELECT repo_id, SUM(contributions) AS total
+                FROM repo_contributors
+                WHERE repo_id IN ({_placeholders(batch)})
+                GROUP BY repo_id
+            ) t ON t.repo_id = rc.repo_id
+            JOIN repositories r ON r.id = rc.repo_id
+            SET rc.allocated_star = COALESCE(r.stars * rc.contributions / NULLIF(t.total, 0), 0)
+        """, batch)
+
+
+def refresh_contributor_totals(cursor, contributor_ids, batch_size=500):
+    """重新汇总这些贡献者在所有仓库上分配到的star"""
+    contributor_ids = list(contributor_ids)
+    for i in range(0, len(contributor_ids), batch_size):
+        batch = contributor_ids[i:i + batch_size]
+        # 先删除再插入，不再出现在任何仓库中的贡献者随之移除
+        cursor.execute(f"DELETE FROM top_contributors WHERE contributor_id IN ({_placeholders(batch)})", batch)
+        cursor.execute(f"""
+            INSERT INTO top_contributors (contributor_id, total_allocated_star, updated_at)
+            SELECT contributor_id, SUM(allocated_star), NOW()
+            FROM repo_contributors
+            WHERE contributor_id IN ({_placeholders(batch)})
+            GROUP BY contributor_id
+        """, batch)
+
+
+def update_repo_contributor_scores(cursor, repo_ids, batch_size=500):
+    """
+    仓库的贡献者或star数变化后，增量更新排行
+
+    参数:
+        cursor: 数据库游标，由调用方提交事务
+        repo_ids: 发生变化的仓库id列表
+    """
+    repo_ids = list(repo_ids)
+    if not repo_ids:
+        return
+
+    refresh_repo_allocations(cursor, repo_ids, batch_size)
+
+    contributor_ids = set()
+    for i in range(0, len(repo_ids), batch_size):
+        batch = repo_ids[i:i + batch_size]
+        cursor.execute(f"SELECT DISTINCT contributor_id FROM repo_contributors WHERE repo_id IN ({_placeholders(batch)})", batch)
+        contributor_ids.update(row[0] for row in cursor.fetchall())
+
+    refresh_contributor_totals(cursor, contributor_ids, batch_size)
+
+
+def rebuild_top_contributors(cursor):
+    """全量重新计算所有仓库的分配值和所有贡献者的总分"""
+    cursor.execute("""
+        UPDATE repo_contributors rc
+        JOIN (
+            SELECT repo_id, SUM(contributions) AS total
+            FROM repo_contributors
+            GROUP BY repo_id
+        ) t ON t.repo_id = rc.repo_id
+        JOIN repositories r ON r.id = rc.repo_id
+        SET rc.allocated_star = COALESCE(r.stars * rc.contributions / NULLIF(t.total, 0), 0)
+    """)
+    cursor.execute("DELETE FROM top_contributors")
+    cursor.execute("""
+        INSERT INTO top_contributors (contributor_id, total_allocated_star, updated_at)
+        SELECT contributor_id, SUM(allocated_star), NOW()
+        FROM repo_contributors
+        GROUP BY contributor_id
+    """)
+    return cursor.rowcount
+
+
+if __name__ == "__main__":
+    from tools.config import DEFAULT_SETTINGS
+    from tools.get_data import conn_init
+
+    conn = conn_init(DEFAULT_SETTINGS)
+    cursor = conn.cursor()
+    try:
+        count = rebuild_top_contributors(cursor)
+        conn.commit()
+        print(f"已重建贡献者排行，共 {count} 位贡献者")
+    except Exception as e:
+        conn.rollback()
+        print(f"重建贡献者排行失败: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
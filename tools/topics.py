@@ -0,0 +1,108 @@
+"""
+仓库topic的规范化存储
+Normalized repository topics
+
+topics表是topic名称字典，repo_topics(repo_id, topic_id)记录仓库与topic的对应关系，
+topic计数和共现统计可以直接在MySQL中用索引聚合，不必把repositories.topics整列读到Python中拆分。
+repositories.topics列仍保留逗号分隔的原始值。
+"""
+from tools.db_writer import bulk_upsert
+
+
+def split_topics(text):
+    """把逗号分隔的topics字符串拆分为去重后的列表"""
+    return sorted({topic for topic in (text or "").split(",") if topic})
+
+
+def _select_in(cursor, query, keys, batch_size=500):
+    """分批执行 WHERE ... IN (...) 查询，query中用{placeholders}表示占位符位置"""
+    keys = list(keys)
+    rows = []
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        cursor.execute(query.format(placeholders=", ".join(["%s"] * len(batch))), batch)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def topic_ids(cursor, names):
+    """
+    获取topic名称对应的id，字典中没有的名称先插入
+
+    返回:
+        {topic名称: topic_id}
+    """
+    names = set(names)
+    if not names:
+        return {}
+
+    query = "SELECT name, id FROM topics WHERE name IN ({placeholders})"
+    ids = {name.lower(): topic_id for name, topic_id in _select_in(cursor, query, names)}
+
+    missing = [name for name in names if name.lower() not in ids]
+    if missing:
+        bulk_upsert(cursor, "topics", ["name"], [(name,) for name in missing], "name = VALUES(name)")
+        ids.update({name.lower(): topic_id for name, topic_id in _select_in(cursor, query, missing)})
+
+    return {name: ids[name.lower()] for name in names}
+
+
+def sync_repo_topics(cursor, repo_topics):
+    """
+    用仓库当前的topics替换repo_topics中的对应关系
+
+    参数:
+        cursor: 数据库游标，由调用方提交事务
+        repo_topics: {仓库url: topic名称列表}
+
+    返回:
+        写入的对应关系数
+    """
+    if not repo_topics:
+        return 0
+
+    repo_ids = dict(_select_in(cursor, "SELECT url, id FROM repositories WHERE url IN ({placeholders})", repo_topics))
+    repo_ids = {url.lower(): repo_id for url, repo_id in repo_ids.items()}
+    ids = topic_ids(cursor, {topic for topics in repo_topics.values() for topic in topics})
+
+    pairs = []
+    synced = []
+    for url, topics in repo_topics.items():
+        repo_id = repo_ids.get(url.lower())
+        if repo_id is None:
+            continue
+        synced.append(repo_id)
+        pairs.extend((repo_id, ids[topic]) for topic in set(topics))
+
+    for i in range(0, len(synced), 500):
+        batch = synced[i:i + 500]
+        cursor.execute(f"DELETE FROM repo_topics WHERE repo_id IN ({', '.join(['%s'] * len(batch))})", batch)
+    bulk_upsert(cursor, "repo_topics", ["repo_id", "topic_id"], pairs, "topic_id = VALUES(topic_id)")
+
+    return len(pairs)
+
+
+def backfill_repo_topics(cursor, batch_size=1000, silence=True):
+    """
+    根据repositories.topics列重建所有仓库的repo_topics，按id分批处理
+
+    返回:
+        写入的对应关系数
+    """
+    total = 0
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, url, topics FROM repositories WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        total += sync_repo_topics(cursor, {url: split_topics(topics) for _, url, topics in rows})
+        last_id = rows[-1][0]
+        if not silence:
+            print(f"已回填到仓库id {last_id}，共 {total} 条topic对应关系")
+
+    return total